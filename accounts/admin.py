@@ -3,7 +3,7 @@ from .models import MailLinkModel
 
 
 class MailLinkModelAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user_email', 'key', 'created_at', 'link_type', 'is_delete']
+    list_display = ['id', 'user_email', 'created_at', 'link_type', 'expires_at', 'consumed_at']
 
     def user_email(self, obj):
         return obj.user.email
@@ -0,0 +1,54 @@
+import hashlib
+import secrets
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import MailLinkModel
+
+
+# Sign up and password reset links. This table only holds the SHA-256 of
+# the key, under a unique index. The key itself is in the mail, which sits
+# in the outbox (accounts/outbox.py) until the worker has sent it and then
+# has its body cleared. A link works until it expires or is used once; using
+# it is a single conditional UPDATE, so two requests racing on the same link
+# can't both succeed. Expired and used links, and old outbox rows, are
+# deleted by the purge_mail_links command.
+
+LINK_LIFETIME = {
+    'sign_up': timedelta(days=3),
+    'reset_password': timedelta(hours=1),
+}
+
+LINK_PATHS = {
+    'sign_up': 'create-account',
+    'reset_password': 'forgot-password',
+}
+
+
+def hash_key(key):
+    return hashlib.sha256((key or '').encode()).hexdigest()
+
+
+def issue_link(user, link_type):
+    # Returns the url to mail, earlier unused links of the same type stop working
+    key = secrets.token_urlsafe(32)
+    now = timezone.now()
+    with transaction.atomic():
+        MailLinkModel.objects.filter(user=user, link_type=link_type, consumed_at__isnull=True).update(consumed_at=now)
+        MailLinkModel.objects.create(user=user, link_type=link_type, token_hash=hash_key(key), expires_at=now + LINK_LIFETIME[link_type])
+    return f"{settings.BASE_URL}{LINK_PATHS[link_type]}?key={key}"
+
+
+def valid_links():
+    return MailLinkModel.objects.filter(consumed_at__isnull=True, expires_at__gt=timezone.now())
+
+
+def find_link(key):
+    # The usable link for key, without using it up
+    return valid_links().filter(token_hash=hash_key(key)).select_related('user').first()
+
+
+def consume_link(link):
+    # True for the one request that gets to use the link
+    return valid_links().filter(pk=link.pk).update(consumed_at=timezone.now()) == 1
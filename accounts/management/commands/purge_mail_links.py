@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import MailLinkModel
+from accounts.outbox import purge_mail
+
+
+class Command(BaseCommand):
+    help = 'Delete expired and used sign up / password reset links and old outbox mail in batches, meant to run from a scheduler (e.g. hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            # Short transactions, so logins and signups are never held up
+            # behind one large delete
+            ids = [pk for pk in MailLinkModel.objects.filter(Q(expires_at__lte=timezone.now()) | Q(consumed_at__isnull=False))
+                   .values_list('pk', flat=True)[:options['batch_size']]]
+            if not ids:
+                break
+            total += MailLinkModel.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{total} links deleted'))
+
+        # The mails carrying those links
+        mails = purge_mail(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{mails} mails deleted'))
@@ -0,0 +1,15 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from accounts.outbox import MAIL_RETENTION, purge_mail
+
+
+class Command(BaseCommand):
+    help = 'Delete sent and failed outbox mail older than the retention period, meant to run from a scheduler (e.g. daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--days', type=float, default=MAIL_RETENTION.total_seconds() / 86400)
+
+    def handle(self, *args, **options):
+        total = purge_mail(timedelta(days=options['days']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} mails deleted'))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from accounts.outbox import outbox_metrics, send_queued_mail
+
+
+class Command(BaseCommand):
+    help = ('Send queued account mail in batches over one SMTP connection. Keeps polling unless --once is given. '
+            'For local testing any SMTP stand-in on EMAIL_HOST:EMAIL_PORT will do, e.g. python -m aiosmtpd -n -l localhost:1025')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is empty')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--rate', type=float, default=None, help='Messages per second, defaults to MAIL_RATE_LIMIT')
+        parser.add_argument('--stats', action='store_true', help='Print the outbox metrics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(' '.join(f'{name}={value}' for name, value in outbox_metrics().items()))
+            return
+
+        while True:
+            stats = send_queued_mail(options['batch_size'], rate=options['rate'])
+            handled = stats['sent'] + stats['retried'] + stats['failed']
+            if handled:
+                self.stdout.write(' '.join(f'{name}={value}' for name, value in stats.items()))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,75 @@
+# Generated by Django 3.1.4 on 2026-10-18 18:10
+
+import hashlib
+from datetime import timedelta
+from django.db import migrations, models
+from django.utils import timezone
+
+
+LINK_LIFETIME = {
+    'sign_up': timedelta(days=3),
+    'reset_password': timedelta(hours=1),
+}
+
+
+def hash_existing_keys(apps, schema_editor):
+    # Links already mailed keep working until they expire, by their hash.
+    # Rows without a key could never be used and are dropped.
+    MailLinkModel = apps.get_model('accounts', 'MailLinkModel')
+    MailLinkModel.objects.filter(models.Q(key__isnull=True) | models.Q(key='')).delete()
+    now = timezone.now()
+    links = []
+    for link in MailLinkModel.objects.all().iterator():
+        link.token_hash = hashlib.sha256(link.key.encode()).hexdigest()
+        link.expires_at = link.created_at + LINK_LIFETIME.get(link.link_type, timedelta(hours=1))
+        link.consumed_at = now if link.is_delete else None
+        links.append(link)
+    MailLinkModel.objects.bulk_update(links, ['token_hash', 'expires_at', 'consumed_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_outbound_mail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='maillinkmodel',
+            name='token_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='maillinkmodel',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='maillinkmodel',
+            name='consumed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(hash_existing_keys, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='maillinkmodel',
+            name='key',
+        ),
+        migrations.RemoveField(
+            model_name='maillinkmodel',
+            name='is_delete',
+        ),
+        migrations.AlterField(
+            model_name='maillinkmodel',
+            name='token_hash',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='maillinkmodel',
+            name='expires_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='maillinkmodel',
+            index=models.Index(fields=['expires_at'], name='mail_link_expires_idx'),
+        ),
+    ]
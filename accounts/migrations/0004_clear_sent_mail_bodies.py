@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def clear_bodies(apps, schema_editor):
+    # Mail handled before bodies were cleared on send still holds its links
+    OutboundMail = apps.get_model('accounts', 'OutboundMail')
+    OutboundMail.objects.filter(status__in=['sent', 'failed']).exclude(body='').update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_mail_link_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_bodies, migrations.RunPython.noop),
+    ]
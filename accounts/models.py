@@ -1,12 +1,16 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class MailLinkModel(models.Model):
+    # A sign up / password reset link (see accounts/mail_links.py). Only the
+    # SHA-256 of the key sent in the mail is stored.
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    key = models.CharField(max_length=255, default="", null=True, blank=True)
+    token_hash = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    is_delete = models.BooleanField(default=False, null=True, blank=True)
+    expires_at = models.DateTimeField()
+    consumed_at = models.DateTimeField(null=True, blank=True)
 
     link_type_choice = (
         ('sign_up', 'SignUp'),
@@ -15,5 +19,42 @@ class MailLinkModel(models.Model):
 
     link_type = models.CharField(max_length=100, default="", choices=link_type_choice, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='mail_link_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.link_type} link ({self.pk})'
+
+
+class OutboundMail(models.Model):
+    # Mail waiting to be sent by the send_outbox worker (accounts/outbox.py),
+    # so requests never wait on the SMTP relay
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, default="", blank=True)
+    to_email = models.EmailField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    mail_status_choice = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    status = models.CharField(max_length=25, default="queued", choices=mail_status_choice)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'send_after'], name='outbound_mail_queue_idx'),
+        ]
+
     def __str__(self):
-        return self.key
+        return f'{self.subject} to {self.to_email} ({self.status})'
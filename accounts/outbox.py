@@ -0,0 +1,154 @@
+import smtplib
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from .models import OutboundMail
+
+
+# Outgoing account mail (sign up and password reset links). Requests only
+# add a row to the outbox; the send_outbox worker sends queued mail in
+# batches over one SMTP connection, paced to MAIL_RATE_LIMIT messages per
+# second, and retries failures with a growing delay. With MAIL_QUEUE_BACKEND
+# = 'immediate' mail is sent inside the request instead, for development
+# without a worker. Bodies carry sign in links, so they are cleared as soon
+# as a message is sent or given up on, and handled rows are deleted after
+# MAIL_RETENTION by purge_mail.
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1)
+# Mail still marked sending after this long belongs to a worker that died
+STALE_AFTER = timedelta(minutes=15)
+
+MAIL_RETENTION = timedelta(days=7)
+
+# Retrying won't help, e.g. the relay refused the address
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+
+def queue_mail(subject, body, to_email, from_email=None):
+    mail = OutboundMail.objects.create(subject=subject, body=body, to_email=to_email,
+                                       from_email=from_email or settings.EMAIL_HOST_USER or settings.DEFAULT_FROM_EMAIL)
+    if getattr(settings, 'MAIL_QUEUE_BACKEND', 'database') == 'immediate':
+        transaction.on_commit(lambda: send_queued_mail(mail_ids=[mail.pk]))
+    return mail
+
+
+def claim_mail(limit=50, mail_ids=None):
+
+    # Marks up to limit due messages as sending and returns them, oldest
+    # first. Rows are locked with SKIP LOCKED on Postgres so several workers
+    # never send the same message.
+
+    now = timezone.now()
+    OutboundMail.objects.filter(status='sending', locked_at__lt=now - STALE_AFTER).update(status='queued', locked_at=None)
+
+    with transaction.atomic():
+        mails = OutboundMail.objects.filter(status='queued', send_after__lte=now).order_by('pk')
+        if mail_ids is not None:
+            mails = mails.filter(pk__in=mail_ids)
+        if connection.features.has_select_for_update_skip_locked:
+            mails = mails.select_for_update(skip_locked=True)
+        mails = [mail for mail in mails[:limit]]
+        OutboundMail.objects.filter(pk__in=[mail.pk for mail in mails]).update(status='sending', locked_at=now, attempts=F('attempts') + 1)
+
+    for mail in mails:
+        mail.attempts += 1
+    return mails
+
+
+def _failed(mail, error):
+    mail.last_error = f'{type(error).__name__}: {error}'
+    if mail.attempts >= MAX_ATTEMPTS or isinstance(error, PERMANENT_ERRORS):
+        mail.status = 'failed'
+        mail.body = ''
+    else:
+        mail.status = 'queued'
+        mail.send_after = timezone.now() + RETRY_DELAY * (2 ** (mail.attempts - 1))
+    mail.locked_at = None
+    mail.save(update_fields=['status', 'body', 'send_after', 'locked_at', 'last_error'])
+
+
+def _close(smtp):
+    try:
+        smtp.close()
+    except (smtplib.SMTPException, OSError):
+        # e.g. the relay already dropped the connection
+        pass
+
+
+def send_queued_mail(limit=50, mail_ids=None, rate=None):
+
+    # Sends one batch and returns counts of what happened to it:
+    # {'sent': .., 'retried': .., 'failed': .., 'seconds': ..}
+
+    started = time.monotonic()
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'seconds': 0.0}
+    mails = claim_mail(limit, mail_ids)
+    if not mails:
+        return stats
+
+    rate = rate if rate is not None else getattr(settings, 'MAIL_RATE_LIMIT', 10)
+    interval = 1.0 / rate if rate else 0
+    next_send = time.monotonic()
+
+    smtp = get_connection(fail_silently=False)
+    try:
+        for mail in mails:
+            if interval:
+                time.sleep(max(0, next_send - time.monotonic()))
+                next_send = time.monotonic() + interval
+
+            message = EmailMessage(subject=mail.subject, body=mail.body, from_email=mail.from_email, to=[mail.to_email], connection=smtp)
+            try:
+                # Connects for the first message (or after an error), the
+                # connection then stays open for the rest of the batch
+                smtp.open()
+                message.send()
+            except Exception as error:
+                _failed(mail, error)
+                stats['failed' if mail.status == 'failed' else 'retried'] += 1
+                # The session may be unusable, the next message reconnects
+                _close(smtp)
+                continue
+
+            mail.status = 'sent'
+            mail.body = ''
+            mail.sent_at = timezone.now()
+            mail.locked_at = None
+            mail.last_error = ''
+            mail.save(update_fields=['status', 'body', 'sent_at', 'locked_at', 'last_error'])
+            stats['sent'] += 1
+    finally:
+        _close(smtp)
+
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    return stats
+
+
+def purge_mail(older_than=MAIL_RETENTION, batch_size=1000):
+    # Deletes sent and failed mail older than older_than in short batches,
+    # returns the number of rows deleted
+    total = 0
+    while True:
+        ids = [pk for pk in OutboundMail.objects.filter(status__in=['sent', 'failed'], created_at__lt=timezone.now() - older_than)
+               .values_list('pk', flat=True)[:batch_size]]
+        if not ids:
+            return total
+        total += OutboundMail.objects.filter(pk__in=ids).delete()[0]
+
+
+def outbox_metrics():
+    # Queue health for the worker's log / monitoring
+    counts = dict(OutboundMail.objects.values_list('status').annotate(total=Count('pk')).order_by())
+    oldest = OutboundMail.objects.filter(status='queued').aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'queued': counts.get('queued', 0),
+        'sending': counts.get('sending', 0),
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_queued_seconds': round((timezone.now() - oldest).total_seconds()) if oldest else 0,
+    }
@@ -1,3 +1,99 @@
-from django.test import TestCase
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .mail_links import consume_link, find_link, hash_key, issue_link
+from .models import MailLinkModel
 
-# Create your tests here.
+
+def link_key(url):
+    return parse_qs(urlparse(url).query)['key'][0]
+
+
+class MailLinkTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password', is_active=False)
+
+    def test_only_the_hash_is_stored(self):
+        key = link_key(issue_link(self.user, 'sign_up'))
+        link = MailLinkModel.objects.get(user=self.user)
+        self.assertEqual(link.token_hash, hash_key(key))
+        self.assertNotEqual(link.token_hash, key)
+
+    def test_link_is_used_once(self):
+        key = link_key(issue_link(self.user, 'sign_up'))
+        link = find_link(key)
+        self.assertIsNotNone(link)
+        self.assertTrue(consume_link(link))
+        self.assertFalse(consume_link(link))
+        self.assertIsNone(find_link(key))
+
+    def test_expired_link_is_refused(self):
+        key = link_key(issue_link(self.user, 'reset_password'))
+        link = find_link(key)
+        MailLinkModel.objects.filter(pk=link.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(find_link(key))
+        self.assertFalse(consume_link(link))
+
+    def test_new_link_replaces_unused_one(self):
+        first = link_key(issue_link(self.user, 'reset_password'))
+        second = link_key(issue_link(self.user, 'reset_password'))
+        self.assertIsNone(find_link(first))
+        self.assertIsNotNone(find_link(second))
+
+    def test_unknown_key_is_refused(self):
+        issue_link(self.user, 'sign_up')
+        self.assertIsNone(find_link('not-a-key'))
+        self.assertIsNone(find_link(None))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class VerifyUserLinkViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com', 'password', is_active=False)
+
+    def test_sign_up_link_activates_once(self):
+        key = link_key(issue_link(self.user, 'sign_up'))
+
+        response = self.client.get(reverse('create_account'), {'key': key})
+        self.assertEqual(response.context['render_kind'], 'signup_confirmed')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+        response = self.client.get(reverse('create_account'), {'key': key})
+        self.assertEqual(response.context['render_kind'], 'invalid_key')
+
+    def test_expired_sign_up_link_is_refused(self):
+        key = link_key(issue_link(self.user, 'sign_up'))
+        MailLinkModel.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.get(reverse('create_account'), {'key': key})
+        self.assertEqual(response.context['render_kind'], 'invalid_key')
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_reset_link_sets_one_password(self):
+        self.user.is_active = True
+        self.user.save()
+        key = link_key(issue_link(self.user, 'reset_password'))
+
+        response = self.client.get(reverse('forgot_password'), {'key': key})
+        self.assertRedirects(response, reverse('create_new_password'), fetch_redirect_response=False)
+
+        data = {'new_password1': 'a-new-Passw0rd', 'new_password2': 'a-new-Passw0rd'}
+        response = self.client.post(reverse('create_new_password'), data)
+        self.assertEqual(response.context['render_kind'], 'password_updated')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('a-new-Passw0rd'))
+
+        response = self.client.get(reverse('forgot_password'), {'key': key})
+        self.assertEqual(response.context['render_kind'], 'invalid_key')
+        data = {'new_password1': 'another-Passw0rd', 'new_password2': 'another-Passw0rd'}
+        response = self.client.post(reverse('create_new_password'), data)
+        self.assertEqual(response.status_code, 404)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('a-new-Passw0rd'))
@@ -1,17 +1,5 @@
-from django.core.mail import send_mail
 from django.conf import settings
-import string
-import random
-
-
-def create_link(link_for: str):
-    choice = string.ascii_letters + string.digits
-    key = "".join(random.choice(choice) for _ in range(30))
-    if link_for == 'sign-up':
-        link = f"{settings.BASE_URL}create-account?key={key}"
-    elif link_for == 'reset-password':
-        link = f"{settings.BASE_URL}forgot-password?key={key}"
-    return link, key
+from .outbox import queue_mail
 
 
 class SendUserMail:
@@ -37,7 +25,6 @@ class SendUserMail:
         Sincerely,\n
         OneTable Support
         """
-        print(content)
         return content
 
     def __reset_password_compose_mail(self):
@@ -50,12 +37,10 @@ class SendUserMail:
         Sincerely,\n
         OneTable Support
         """
-        print(content)
         return content
 
     def send(self):
-        try:
-            send_mail(subject=self.subject, message=self.content, from_email=self.from_email, recipient_list=[self.recipient_list], fail_silently=True)
-            return True
-        except Exception:
-            return False
+        # Queued for the send_outbox worker (see accounts/outbox.py), the
+        # request doesn't wait on the SMTP relay
+        queue_mail(subject=self.subject, body=self.content, to_email=self.recipient_list, from_email=self.from_email)
+        return True
@@ -3,8 +3,8 @@ from django.views import generic, View
 from django.urls import reverse_lazy
 from .forms import SignUpForm, UpdateProfileForm, UpdatePasswordForm, UserLoginForm, UserPasswordResetForm, UserSetPasswordForm
 from django.contrib.auth.models import User
-from .user_mailing import create_link, SendUserMail
-from .models import MailLinkModel
+from .user_mailing import SendUserMail
+from .mail_links import issue_link, find_link, consume_link, valid_links
 from django.contrib.auth import authenticate, login
 
 
@@ -44,10 +44,7 @@ class UserRegistrationView(View):
             user = form.save()
             user_email = user.email
             user_name = user.get_full_name()
-            link, key = create_link(link_for='sign-up')
-            obj, created = MailLinkModel.objects.update_or_create(user=user, link_type="sign_up", is_delete=False)
-            obj.key = key
-            obj.save()
+            link = issue_link(user, 'sign_up')
             mail = SendUserMail(recipient_name=user_name, link=link, recipient_list=user_email, subject="Complete OneTable Sign Up", mail_for="sign-up")
             status = mail.send()
             context = {'email': user_email, 'render_kind': 'signup'}
@@ -93,20 +90,19 @@ class UpdateProfilePassword(View):
 class VerifyUserLinkView(View):
     def get(self, request):
         get_key = request.GET.get('key')
-        link_obj = get_object_or_404(MailLinkModel, key=get_key)
-        if link_obj:
-            if link_obj.is_delete is False:
-                user = get_object_or_404(User, pk=link_obj.user_id)
-                if link_obj.link_type == 'sign_up':
+        link_obj = find_link(get_key)
+        if link_obj and link_obj.user_id:
+            user = link_obj.user
+            if link_obj.link_type == 'sign_up':
+                if consume_link(link_obj):
                     user.is_active = True
                     user.save()
-                    link_obj.is_delete = True
-                    link_obj.save()
                     return render(request, 'signup_thankyou_page.html', {'render_kind': 'signup_confirmed'})
-                elif link_obj.link_type == 'reset_password':
-                    request.session['forgot_password_user_pk'] = user.pk
-                    request.session['forgot_password_link_pk'] = link_obj.pk
-                    return redirect('create_new_password')
+            elif link_obj.link_type == 'reset_password':
+                # Used up once the new password is saved
+                request.session['forgot_password_user_pk'] = user.pk
+                request.session['forgot_password_link_pk'] = link_obj.pk
+                return redirect('create_new_password')
         return render(request, 'signup_thankyou_page.html', {'render_kind': 'invalid_key'})
 
 
@@ -125,10 +121,7 @@ class ResetPasswordView(View):
             if user.is_active:
                 user_email = user.email
                 user_name = user.get_full_name()
-                link, key = create_link(link_for='reset-password')
-                obj, created = MailLinkModel.objects.update_or_create(user=user, link_type="reset_password", is_delete=False)
-                obj.key = key
-                obj.save()
+                link = issue_link(user, 'reset_password')
                 mail = SendUserMail(recipient_name=user_name, link=link, recipient_list=user_email, subject="Reset your OneTable password", mail_for="reset-password")
                 status = mail.send()
                 context = {'email': user_email, 'render_kind': 'reset_password'}
@@ -146,17 +139,17 @@ class CreateNewPasswordView(View):
         return render(request, self.template_name, locals())
 
     def post(self, request):
-        user_pk = request.POST.get('user_id')
-        user = get_object_or_404(User, pk=user_pk)
+        # The user comes from the link verified by VerifyUserLinkView, which
+        # has to be still usable when the new password is set
+        link_obj = get_object_or_404(valid_links(), pk=request.session.get('forgot_password_link_pk'), link_type='reset_password')
+        user = get_object_or_404(User, pk=link_obj.user_id)
         form = UserSetPasswordForm(data=request.POST, user=user)
         if form.is_valid():
+            if not consume_link(link_obj):
+                return render(request, 'signup_thankyou_page.html', {'render_kind': 'invalid_key'})
             form.save()
-            request.session.pop('forgot_password_user_pk')
-            link_obj_pk = request.session.get('forgot_password_link_pk')
-            link_obj = get_object_or_404(MailLinkModel, pk=link_obj_pk)
-            link_obj.is_delete = True
-            link_obj.save()
-            request.session.pop('forgot_password_link_pk')
+            request.session.pop('forgot_password_user_pk', None)
+            request.session.pop('forgot_password_link_pk', None)
         else:
             return render(request, self.template_name, locals())
         return render(request, 'signup_thankyou_page.html', {'render_kind': 'password_updated'})
@@ -30,10 +30,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'storages',
     'accounts',
     'home',
-    'imagekit',
     ]
 
 MIDDLEWARE = [
@@ -142,6 +142,41 @@ STATIC_URL = '/static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Version stamps for permissions and cached fragments must be shared by all
+# web processes, so the default per-process memory cache is not enough.
+# Create the table with: python manage.py createcachetable
+# Fragments are cached per user, URL and version, far more entries than the
+# default MAX_ENTRIES of 300 which would cull them almost at once. Past
+# MAX_ENTRIES, expired entries and then 1/CULL_FREQUENCY of the rest are
+# dropped; an evicted version stamp is restarted from the clock, which only
+# costs a miss.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'home_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 200000,
+            'CULL_FREQUENCY': 10,
+        },
+    }
+}
+
+# Scoped queries (home/models.py TenantManager) filter on the organization /
+# app keys of the row itself. Set to True only during the deploy adding the
+# keys, until backfill_tenant_keys has run, to also match unfilled rows
+# through the list -> app join.
+TENANT_KEYS_FALLBACK = False
+
+# Background jobs (home/jobs.py): 'database' queues them for the run_jobs
+# worker, 'immediate' runs them inside the request
+JOB_BACKEND = 'database'
+
+# Account mail (accounts/outbox.py): 'database' queues it for the send_outbox
+# worker, 'immediate' sends it inside the request. MAIL_RATE_LIMIT is the
+# most messages per second a worker hands to the SMTP relay.
+MAIL_QUEUE_BACKEND = 'database'
+MAIL_RATE_LIMIT = 10
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'localhost'
 EMAIL_PORT = 1025
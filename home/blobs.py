@@ -0,0 +1,102 @@
+import hashlib
+import inspect
+from datetime import timedelta
+from urllib.parse import quote
+from django.http import FileResponse
+from django.shortcuts import redirect
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Blob
+
+
+# Content-addressed storage for record files. Every distinct content is
+# stored once under its SHA-256 and counted by the RecordFiles using it, so
+# identical attachments share one object and renames never touch storage.
+# Blobs nobody uses any more are deleted by collect_garbage.
+
+
+def blob_name(content_hash, extension=''):
+    # The extension is kept so storage backends serve the right content type
+    return f'blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension.lower()}'
+
+
+def file_hash(content):
+    sha256 = hashlib.sha256()
+    for data in content.chunks():
+        sha256.update(data)
+    return sha256.hexdigest()
+
+
+def add_reference(content_hash):
+    # Returns the blob with one more reference, or None if it isn't stored
+    if Blob.objects.filter(pk=content_hash).update(ref_count=F('ref_count') + 1, released_at=None):
+        return Blob.objects.get(pk=content_hash)
+    return None
+
+
+def create_blob(content_hash, content, extension=''):
+
+    # Stores content, already hashed to content_hash, with one reference
+
+    name = default_storage.save(blob_name(content_hash, extension), content)
+    try:
+        with transaction.atomic():
+            return Blob.objects.create(sha256=content_hash, file=name, size=default_storage.size(name), ref_count=1)
+    except IntegrityError:
+        # A concurrent upload of the same content got there first. Storage
+        # that overwrites (S3) wrote to the winner's own object, which must
+        # stay; storage that renames left a copy of ours to remove.
+        blob = add_reference(content_hash)
+        if blob is None or blob.file.name != name:
+            default_storage.delete(name)
+        return blob
+
+
+def content_disposition(file_name):
+    # Same header FileResponse(as_attachment=True) would send
+    try:
+        file_name.encode('ascii')
+        return 'attachment; filename="{}"'.format(file_name.replace('\\', '\\\\').replace('"', r'\"'))
+    except UnicodeEncodeError:
+        return "attachment; filename*=utf-8''{}".format(quote(file_name))
+
+
+def download_response(field_file, file_name):
+
+    # Blob names are content hashes, the name people know a file by only
+    # lives in the database. Storage with signed URLs (S3) is asked to send
+    # it as Content-Disposition, other storage is streamed through Django.
+
+    storage = field_file.storage
+    if 'parameters' in inspect.signature(storage.url).parameters:
+        return redirect(storage.url(field_file.name, parameters={'ResponseContentDisposition': content_disposition(file_name)}))
+    return FileResponse(field_file.open('rb'), as_attachment=True, filename=file_name)
+
+
+def store_file(content, extension=''):
+    # For files already at hand (request uploads, legacy files): hashes them
+    # and only writes when the content is new
+    content_hash = file_hash(content)
+    return add_reference(content_hash) or create_blob(content_hash, content, extension)
+
+
+def release_blob(content_hash):
+    Blob.objects.filter(pk=content_hash, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    Blob.objects.filter(pk=content_hash, ref_count=0, released_at=None).update(released_at=timezone.now())
+
+
+def collect_garbage(grace=timedelta(hours=24)):
+
+    # Deletes blobs that have had no references for longer than grace. The
+    # row goes first, with the same condition, so a blob picked up again in
+    # the meantime is left alone.
+
+    deleted = 0
+    cutoff = timezone.now() - grace
+    for blob in Blob.objects.filter(ref_count=0, released_at__lt=cutoff).iterator():
+        if Blob.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+            default_storage.delete(blob.file.name)
+            deleted += 1
+    return deleted
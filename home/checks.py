@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# Cached permissions (home/permissions.py) and fragment version stamps
+# (home/fragments.py) are invalidated by changing a key in the cache. With a
+# cache each process keeps to itself, the other web workers never see the
+# change: a removed member keeps access until their entry times out.
+
+PROCESS_LOCAL_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f'The default cache ({backend}) is not shared between processes, so revoked permissions '
+            'stay cached in other workers.',
+            hint='Use a shared backend such as DatabaseCache or memcached.',
+            id='home.W001')]
+    return []
@@ -0,0 +1,42 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Organization, OrganizationUser, App, List, Record, InactiveUsers
+
+
+# Counters kept on the models so index pages don't have to count rows per
+# card. Record counts move with F() increments inside the writing transaction;
+# member counts are recounted for the one organization that changed, since
+# those writes are rare. reconcile_counters repairs any drift.
+
+
+def adjust_record_count(list_pk, delta):
+    if list_pk is None or not delta:
+        return
+    # Clamped at 0: a counter that drifted low must not fail the user's
+    # write by going negative (record_count is a PositiveIntegerField)
+    List.objects.filter(pk=list_pk).update(record_count=Greatest(F('record_count') + delta, Value(0)))
+
+
+def _count(queryset, outer_field, outer_ref='pk'):
+    # Correlated COUNT subquery, 0 instead of NULL when nothing matches
+    counts = queryset.filter(**{outer_field: OuterRef(outer_ref)}).order_by() \
+        .values(outer_field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def refresh_member_counts(organizations):
+
+    # Recounts the members of the given organizations and of all their apps,
+    # two UPDATE statements whatever the number of apps. Apps count the active
+    # users of their organization plus the invited users attached to the app.
+
+    active_users = OrganizationUser.objects.filter(status='active')
+    Organization.objects.filter(pk__in=organizations).update(
+        member_count=_count(active_users, 'organization') + _count(Organization.inactive_users.through.objects.all(), 'organization'))
+    App.objects.filter(organization__in=organizations).update(
+        member_count=_count(active_users, 'organization', 'organization') + _count(InactiveUsers.attached_workspaces.through.objects.all(), 'app'))
+
+
+def refresh_record_counts(lists):
+    List.objects.filter(pk__in=lists).update(
+        record_count=_count(Record.objects.filter(status='active'), 'list'))
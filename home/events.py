@@ -0,0 +1,82 @@
+import threading
+from django.core.signals import request_finished
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Event
+from .pagination import KeysetPaginator
+
+
+# Activity logging. log_event only appends to a per-thread buffer (once the
+# surrounding transaction has committed); the buffer is written with one
+# bulk insert when the request has finished and the response is already on
+# its way, so logging adds no query to the write paths themselves. Code
+# running outside requests (commands, jobs) calls flush_events itself, and
+# a full buffer is flushed right away.
+
+EVENT_BUFFER_SIZE = 500
+
+_buffer = threading.local()
+
+
+def _pending():
+    if not hasattr(_buffer, 'events'):
+        _buffer.events = []
+    return _buffer.events
+
+
+def _append(event):
+    events = _pending()
+    events.append(event)
+    if len(events) >= EVENT_BUFFER_SIZE:
+        flush_events()
+
+
+def log_event(verb, organization_id, app_id=None, list_id=None, record_id=None, user=None, data=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    event = Event(verb=verb, organization_id=organization_id, app_id=app_id, list_id=list_id,
+                  record_id=record_id, user_id=user_id, data=data or None, created_at=timezone.now())
+    transaction.on_commit(lambda: _append(event))
+
+
+def flush_events():
+    events = _pending()
+    if not events:
+        return 0
+    # Taken out of the buffer first, a failed insert is not retried forever
+    _buffer.events = []
+    Event.objects.bulk_create(events, batch_size=EVENT_BUFFER_SIZE)
+    return len(events)
+
+
+@receiver(request_finished, dispatch_uid='home.events.flush')
+def flush_events_after_request(sender, **kwargs):
+    if flush_events():
+        # Django has already closed the request's connection by now
+        close_old_connections()
+
+
+
+ACTIVITY_PAGE_SIZE = 50
+ACTIVITY_MAX_PAGE_SIZE = 200
+
+
+def activity_page(app_id, token=None, per_page=ACTIVITY_PAGE_SIZE, record_id=None):
+    # Newest first, by id, so a page is one backwards scan of an index
+    events = Event.objects.filter(app_id=app_id).select_related('user')
+    if record_id:
+        events = events.filter(record_id=record_id)
+    per_page = max(1, min(int(per_page), ACTIVITY_MAX_PAGE_SIZE))
+    return KeysetPaginator(events, per_page, ordering=('-id',)).get_page(token)
+
+
+def event_data(event):
+    return {
+        'id': event.pk,
+        'verb': event.get_verb_display(),
+        'created_at': event.created_at.isoformat(),
+        'user': event.user.email if event.user is not None else None,
+        'list': event.list_id,
+        'record': event.record_id,
+        'data': event.data,
+    }
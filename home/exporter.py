@@ -0,0 +1,103 @@
+import csv
+import json
+from itertools import groupby
+from .models import ListField, Record, RecordField, RecordRow
+
+
+class Echo:
+    # File-like object for csv.writer that hands each row back instead of
+    # buffering it, see the Django docs on streaming large CSV files
+    def write(self, value):
+        return value
+
+
+def export_columns(list):
+    return [list_field for list_field in ListField.objects.filter(list=list, status='active').order_by('order')
+            if list_field.field_type != 'instructions']
+
+
+def _export_materialized(record_ids, columns, field_ids):
+    # One chunk of a list with materialized rows, in the order given. Records
+    # without a RecordRow (the flag was just turned on and rebuild_record_rows
+    # hasn't run, or the row was lost) are pivoted from RecordField instead,
+    # as record_grid.py does
+    rows = dict(RecordRow.objects.filter(record_id__in=record_ids).values_list('record_id', 'values'))
+
+    fallback = {}
+    missing_ids = [record_id for record_id in record_ids if record_id not in rows]
+    if missing_ids:
+        values = RecordField.objects.filter(
+            record_id__in=missing_ids,
+            status='active',
+            list_field__in=columns).values_list('record_id', 'list_field_id', 'value')
+        for record_id, list_field_id, value in values:
+            fallback.setdefault(record_id, {})[list_field_id] = value
+
+    for record_id in record_ids:
+        if record_id in rows:
+            yield record_id, {field_ids[field_id]: value for field_id, value in rows[record_id].items() if field_id in field_ids}
+        else:
+            yield record_id, fallback.get(record_id, {})
+
+
+def export_records(list, columns, chunk_size=2000):
+
+    # Yields (record_id, {list_field_id: value}) for every active record of
+    # the list, pivoted from its RecordField rows. A single query is walked
+    # with a server-side cursor (on Postgres), sorted by record so each
+    # record's fields arrive together and only one record is held at a time.
+    # Lists with materialized rows walk their active record ids instead and
+    # read them from RecordRow a chunk at a time.
+
+    if list.materialize_rows:
+        field_ids = {list_field.field_id: list_field.id for list_field in columns}
+        record_ids = Record.objects.filter(list=list, status='active') \
+            .order_by('created_at', 'id') \
+            .values_list('id', flat=True) \
+            .iterator(chunk_size=chunk_size)
+        chunk = []
+        for record_id in record_ids:
+            chunk.append(record_id)
+            if len(chunk) >= chunk_size:
+                yield from _export_materialized(chunk, columns, field_ids)
+                chunk = []
+        if chunk:
+            yield from _export_materialized(chunk, columns, field_ids)
+        return
+
+    values = RecordField.objects.filter(
+        record__list=list,
+        record__status='active',
+        status='active',
+        list_field__in=columns) \
+        .order_by('record__created_at', 'record_id') \
+        .values_list('record_id', 'list_field_id', 'value') \
+        .iterator(chunk_size=chunk_size)
+
+    for record_id, record_values in groupby(values, key=lambda value: value[0]):
+        yield record_id, {list_field_id: value for _, list_field_id, value in record_values}
+
+
+def export_csv(list):
+    columns = export_columns(list)
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(['id'] + [list_field.field_label for list_field in columns])
+    for record_id, values in export_records(list, columns):
+        yield writer.writerow([record_id] + [values.get(list_field.id, '') for list_field in columns])
+
+
+def export_jsonl(list):
+    columns = export_columns(list)
+
+    for record_id, values in export_records(list, columns):
+        row = {'id': record_id}
+        for list_field in columns:
+            row[list_field.field_label] = values.get(list_field.id)
+        yield json.dumps(row) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+}
@@ -0,0 +1,98 @@
+import hashlib
+import inspect
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from .permissions import _permission_version
+
+
+# Cached AJAX fragments. Every app, list and record has a version stamp in
+# the cache that the write paths bump; a fragment is keyed (and ETagged) on
+# the stamps it depends on, so unchanged fragments are served from the cache
+# or answered with 304 before the view runs a single query.
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(kind, pk):
+    return f'home:version:{kind}:{pk}'
+
+
+def get_versions(scopes):
+    # Versions start from the clock, like the permission versions, so an
+    # evicted stamp never comes back with a value that was already used
+    keys = [_version_key(kind, pk) for kind, pk in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(kind, *pks):
+    for pk in pks:
+        if pk is None:
+            continue
+        try:
+            cache.incr(_version_key(kind, pk))
+        except ValueError:
+            cache.set(_version_key(kind, pk), int(time.time() * 1000), None)
+
+
+def bump_app(*pks):
+    bump('app', *pks)
+
+
+def bump_list(*pks):
+    bump('list', *pks)
+
+
+def bump_record(*pks):
+    bump('record', *pks)
+
+
+def cached_fragment(*kinds):
+
+    # For the AJAX (GET) side of a view: kinds are the url arguments the
+    # fragment depends on, e.g. cached_fragment('app', 'list') for a view
+    # taking app_pk and list_pk. Goes below the access check decorators.
+
+    def decorator(view):
+        signature = inspect.signature(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not (request.is_ajax() and request.method == "GET"):
+                return view(request, *args, **kwargs)
+
+            arguments = signature.bind(request, *args, **kwargs).arguments
+            scopes = [(kind, arguments[f'{kind}_pk']) for kind in kinds]
+            stamp = [view.__module__, view.__name__, str(request.user.pk), request.GET.urlencode(),
+                     str(_permission_version(arguments['organization_pk']))]
+            stamp += [f'{kind}:{pk}:{version}' for (kind, pk), version in zip(scopes, get_versions(scopes))]
+            etag = hashlib.md5('|'.join(stamp).encode()).hexdigest()
+
+            if quote_etag(etag) in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponse(status=304)
+            else:
+                key = f'home:fragment:{etag}'
+                content = cache.get(key)
+                if content is not None:
+                    response = HttpResponse(content, content_type='application/json')
+                else:
+                    response = view(request, *args, **kwargs)
+                    if not isinstance(response, JsonResponse) or response.status_code != 200:
+                        return response
+                    cache.set(key, response.content, FRAGMENT_CACHE_TIMEOUT)
+
+            # The same url serves the full page to normal requests
+            response['ETag'] = quote_etag(etag)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ['X-Requested-With'])
+            return response
+        return wrapper
+    return decorator
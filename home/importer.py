@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+from django.db import transaction
+from .models import ListField, Record, RecordField, RecordRelation, randomstr
+from .search import refresh_search_documents
+from .record_rows import refresh_record_rows
+from .counters import adjust_record_count
+from .fragments import bump_app, bump_list
+
+
+class RecordImportError(Exception):
+    pass
+
+
+class RecordImporter:
+
+    # Streams rows from a CSV or JSONL file into a list. Rows are read one at a
+    # time and written in batches, each batch in its own transaction, so memory
+    # stays bounded by the batch size and a failed import can be resumed from
+    # the last committed row with start_row.
+
+    def __init__(self, list, user=None, batch_size=1000, progress=None):
+        self.list = list
+        self.user = user
+        self.batch_size = batch_size
+        self.progress = progress
+
+        # Tenant keys of the new rows, from the app if the list has none yet
+        self.app_id = list.app_id
+        self.organization_id = list.organization_id or list.app.organization_id
+
+        self.list_fields = [list_field for list_field in ListField.objects.filter(list=list, status='active').order_by('order')]
+        self.fields_by_id = {list_field.field_id: list_field for list_field in self.list_fields}
+        self.fields_by_label = {list_field.field_label.strip().lower(): list_field for list_field in self.list_fields}
+        self.column_fields = {}
+        self.select_lookups = {}
+
+    def _column_field(self, column):
+        # Columns can be named after either the field_id or the field label,
+        # each name is looked up once per import
+        if column not in self.column_fields:
+            key = str(column).strip()
+            list_field = self.fields_by_id.get(key) or self.fields_by_label.get(key.lower())
+            if list_field is not None and list_field.field_type == 'instructions':
+                list_field = None
+            self.column_fields[column] = list_field
+        return self.column_fields[column]
+
+    def _map_columns(self, columns):
+        column_map = {}
+        for column in columns:
+            list_field = self._column_field(column)
+            if list_field is not None:
+                column_map[column] = list_field
+        return column_map
+
+    def _select_lookup(self, list_field):
+        # Primary value -> record id for the target list of a choose-from-list
+        # field, loaded once per import
+        if list_field.select_list_id not in self.select_lookups:
+            lookup = {}
+            values = RecordField.objects.filter(
+                record__list_id=list_field.select_list_id,
+                record__status='active',
+                status='active',
+                list_field__primary=True).values_list('record_id', 'value')
+            for record_id, value in values:
+                lookup[record_id] = (record_id, value)
+                if value:
+                    lookup.setdefault(value.strip().lower(), (record_id, value))
+            self.select_lookups[list_field.select_list_id] = lookup
+        return self.select_lookups[list_field.select_list_id]
+
+    def _read_csv(self, stream):
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield row
+
+    def _read_jsonl(self, stream):
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    def _build_record(self, row, column_map):
+        record = Record(id=randomstr(), list=self.list, app_id=self.app_id, organization_id=self.organization_id,
+                        status='active', created_user=self.user)
+        record_fields = []
+        record_relations = []
+
+        for column, list_field in column_map.items():
+            value = row.get(column)
+            if value is None or value == '':
+                continue
+            value = str(value)
+            selected_record_id = None
+
+            if list_field.field_type == 'choose-from-list':
+                # Match on the target record id first, then on its primary value
+                lookup = self._select_lookup(list_field)
+                match = lookup.get(value) or lookup.get(value.strip().lower())
+                if match is None:
+                    continue
+                selected_record_id, value = match
+
+            record_field = RecordField(
+                id=randomstr(),
+                record=record,
+                app_id=record.app_id,
+                organization_id=record.organization_id,
+                list_field=list_field,
+                value=value,
+                selected_record_id=selected_record_id,
+                status='active',
+                created_user=self.user)
+            record_field.set_typed_values(field_type=list_field.field_type)
+            record_fields.append(record_field)
+
+            if selected_record_id is not None:
+                record_relations.append(RecordRelation(
+                    id=randomstr(),
+                    parent_record=record,
+                    app_id=record.app_id,
+                    organization_id=record.organization_id,
+                    child_record_id=selected_record_id,
+                    relation_type='choose-from-list',
+                    list_field=list_field,
+                    status='active',
+                    created_user=self.user))
+
+        return record, record_fields, record_relations
+
+    def _write_batch(self, records, record_fields, record_relations):
+        with transaction.atomic():
+            Record.objects.bulk_create(records)
+            RecordField.objects.bulk_create(record_fields)
+            RecordRelation.objects.bulk_create(record_relations)
+            adjust_record_count(self.list.pk, len(records))
+            refresh_search_documents(records)
+            if self.list.materialize_rows:
+                refresh_record_rows(records)
+        bump_app(self.list.app_id)
+        bump_list(self.list.pk)
+
+    def run(self, stream, file_format='csv', start_row=0):
+
+        # stream is a text file object. start_row is the number of data rows to
+        # skip, i.e. the rows_done reported by a previous, interrupted import.
+        # CSV columns are mapped once from the header, JSONL ones per row as
+        # each object can have its own keys.
+
+        if file_format == 'csv':
+            rows = self._read_csv(stream)
+        elif file_format == 'jsonl':
+            rows = self._read_jsonl(stream)
+        else:
+            raise RecordImportError(f'Unsupported file format: {file_format}')
+
+        column_map = None
+        rows_done = start_row
+        last_index = None
+        imported = 0
+        skipped = 0
+        records, record_fields, record_relations = [], [], []
+
+        for index, row in enumerate(rows):
+            if index < start_row:
+                continue
+            if not isinstance(row, dict):
+                raise RecordImportError(f'Row {index} is not an object')
+            if column_map is None or file_format == 'jsonl':
+                column_map = self._map_columns(row.keys())
+                if file_format == 'csv' and not column_map:
+                    raise RecordImportError('None of the columns match a field of this list')
+
+            record, fields, relations = self._build_record(row, column_map)
+            if fields:
+                records.append(record)
+                record_fields.extend(fields)
+                record_relations.extend(relations)
+            else:
+                skipped += 1
+            last_index = index
+
+            if len(records) >= self.batch_size:
+                self._write_batch(records, record_fields, record_relations)
+                imported += len(records)
+                rows_done = index + 1
+                records, record_fields, record_relations = [], [], []
+                if self.progress is not None:
+                    self.progress(rows_done, imported)
+
+        if last_index is not None and not any(self.column_fields.values()):
+            raise RecordImportError('None of the columns match a field of this list')
+
+        if last_index is not None:
+            if records:
+                self._write_batch(records, record_fields, record_relations)
+                imported += len(records)
+            rows_done = last_index + 1
+            if self.progress is not None:
+                self.progress(rows_done, imported)
+
+        return {
+            'imported': imported,
+            'skipped': skipped,
+            'rows_done': rows_done,
+        }
+
+
+def open_import_file(uploaded_file):
+    # Wraps a binary upload / file so the readers above get decoded text lines
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
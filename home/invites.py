@@ -0,0 +1,76 @@
+from django.db import transaction
+from .models import Organization, OrganizationUser, InactiveUsers
+from .counters import refresh_member_counts
+from .permissions import invalidate_permissions
+
+
+# Invites are InactiveUsers rows: an email attached to organizations and
+# apps before the person has an account. Once the account is active they
+# are turned into OrganizationUser rows and permitted apps, for any number
+# of users in a fixed number of queries.
+
+
+def reconcile_invites(users):
+
+    # Safe to run again: users keep the memberships they already have, only
+    # the missing ones are created, and the invites are gone afterwards.
+    # Returns the number of invites turned into memberships.
+
+    users_by_email = {}
+    for user in users:
+        if user.is_active and user.email:
+            users_by_email.setdefault(user.email, user.pk)
+    if not users_by_email:
+        return 0
+
+    with transaction.atomic():
+        invites = {pk: users_by_email[email] for pk, email in InactiveUsers.objects.filter(user_email__in=users_by_email.keys()).values_list('pk', 'user_email')}
+        if not invites:
+            return 0
+
+        # (user, organization) pairs from organization invites and from the
+        # organizations of the invited apps
+        memberships = set()
+        for invite_pk, organization_pk in Organization.inactive_users.through.objects.filter(inactiveusers_id__in=invites.keys()) \
+                .values_list('inactiveusers_id', 'organization_id'):
+            memberships.add((invites[invite_pk], organization_pk))
+        app_invites = []
+        for invite_pk, app_pk, organization_pk in InactiveUsers.attached_workspaces.through.objects.filter(inactiveusers_id__in=invites.keys()) \
+                .values_list('inactiveusers_id', 'app_id', 'app__organization_id'):
+            if organization_pk is None:
+                continue
+            memberships.add((invites[invite_pk], organization_pk))
+            app_invites.append((invites[invite_pk], organization_pk, app_pk))
+
+        user_pks = set(user_pk for user_pk, organization_pk in memberships)
+        organization_pks = set(organization_pk for user_pk, organization_pk in memberships)
+
+        def existing_memberships():
+            # The first OrganizationUser of a pair is the one views use
+            existing = {}
+            for pk, user_pk, organization_pk in OrganizationUser.objects.filter(user_id__in=user_pks, organization_id__in=organization_pks) \
+                    .order_by('pk').values_list('pk', 'user_id', 'organization_id'):
+                existing.setdefault((user_pk, organization_pk), pk)
+            return existing
+
+        existing = existing_memberships()
+        missing = [OrganizationUser(user_id=user_pk, organization_id=organization_pk)
+                   for user_pk, organization_pk in memberships if (user_pk, organization_pk) not in existing]
+        if missing:
+            OrganizationUser.objects.bulk_create(missing)
+            existing = existing_memberships()
+
+        permitted_apps = OrganizationUser.permitted_apps.through
+        permitted_apps.objects.bulk_create(
+            [permitted_apps(organizationuser_id=existing[(user_pk, organization_pk)], app_id=app_pk) for user_pk, organization_pk, app_pk in app_invites],
+            ignore_conflicts=True)
+
+        InactiveUsers.objects.filter(pk__in=invites.keys()).delete()
+
+        # Bulk writes send no signals, so the counters and cached permissions
+        # are updated here
+        refresh_member_counts(organization_pks)
+        for organization_pk in organization_pks:
+            transaction.on_commit(lambda organization_pk=organization_pk: invalidate_permissions(organization_pk))
+
+    return len(invites)
@@ -0,0 +1,85 @@
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Job
+
+
+# Small background job queue. The default 'database' backend stores jobs in
+# the Job table for the run_jobs worker; 'immediate' runs them inline, which
+# is handy in development when no worker is running.
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(seconds=30)
+# Jobs still marked running after this long belong to a worker that died
+STALE_AFTER = timedelta(minutes=30)
+
+
+def enqueue(func, **payload):
+
+    # func is a module level function, it is stored by dotted path so the
+    # worker can import it. payload must be JSON serializable.
+
+    name = f'{func.__module__}.{func.__name__}'
+    if getattr(settings, 'JOB_BACKEND', 'database') == 'immediate':
+        func(**payload)
+        return None
+    return Job.objects.create(name=name, payload=payload)
+
+
+def claim_jobs(limit=10):
+
+    # Marks up to limit due jobs as running and returns them. On Postgres the
+    # rows are locked with SKIP LOCKED so several workers never take the same job.
+
+    now = timezone.now()
+    Job.objects.filter(status='running', locked_at__lt=now - STALE_AFTER).update(status='queued', locked_at=None)
+
+    with transaction.atomic():
+        jobs = Job.objects.filter(status='queued', run_after__lte=now).order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        jobs = [job for job in jobs[:limit]]
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(status='running', locked_at=now, attempts=F('attempts') + 1)
+
+    for job in jobs:
+        job.status = 'running'
+        job.locked_at = now
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+
+    # Failed jobs go back in the queue with a growing delay until they have
+    # used up MAX_ATTEMPTS
+
+    try:
+        import_string(job.name)(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        else:
+            job.status = 'queued'
+            job.run_after = timezone.now() + RETRY_DELAY * (2 ** (job.attempts - 1))
+        job.locked_at = None
+        job.save(update_fields=['status', 'run_after', 'locked_at', 'finished_at', 'last_error'])
+        return False
+
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=['status', 'locked_at', 'finished_at'])
+    return True
+
+
+def run_pending_jobs(limit=10):
+    jobs = claim_jobs(limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
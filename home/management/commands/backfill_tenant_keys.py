@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from home.tenants import BACKFILL_BATCH_SIZE, TENANT_TABLES, backfill_tenant_keys
+
+
+class Command(BaseCommand):
+    help = 'Fill the app / organization keys of lists, records, record fields and relations that are missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+        parser.add_argument('--model', action='append', choices=[table[0] for table in TENANT_TABLES],
+                            help='Only this table (repeatable), default all of them in order')
+        parser.add_argument('--start-after', default='', help='Resume the first table after this id')
+
+    def handle(self, *args, **options):
+        model_names = [table[0] for table in TENANT_TABLES if not options['model'] or table[0] in options['model']]
+
+        def progress(model_name, filled, last_pk):
+            self.stdout.write(f'{model_name}: {filled} rows filled, last id {last_pk}')
+
+        start_after = options['start_after']
+        for model_name in model_names:
+            filled = backfill_tenant_keys(model_name, options['batch_size'], start_after, progress=progress)
+            start_after = ''
+            self.stdout.write(self.style.SUCCESS(f'{model_name}: {filled} rows filled'))
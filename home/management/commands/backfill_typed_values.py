@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from home.models import RecordField
+
+
+class Command(BaseCommand):
+    help = 'Populate the typed value columns (number / date / text) of existing record fields in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--list', dest='list_pk', default=None, help='Only backfill the fields of this list')
+        parser.add_argument('--start-after', default='', help='Resume after this record field pk')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_after']
+
+        record_fields = RecordField.objects.select_related('list_field') \
+            .only('id', 'value', 'list_field__field_type') \
+            .order_by('pk')
+        if options['list_pk']:
+            record_fields = record_fields.filter(list_field__list_id=options['list_pk'])
+
+        total = 0
+        while True:
+            # Walk the table by primary key so each batch is an index range scan
+            batch = [record_field for record_field in record_fields.filter(pk__gt=last_pk)[:batch_size]]
+            if not batch:
+                break
+
+            for record_field in batch:
+                record_field.set_typed_values(field_type=record_field.list_field.field_type if record_field.list_field else None)
+
+            with transaction.atomic():
+                RecordField.objects.bulk_update(batch, ['value_number', 'value_date', 'value_text'])
+
+            total += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'Backfilled {total} record fields (last pk {last_pk})')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} record fields backfilled'))
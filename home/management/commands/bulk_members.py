@@ -0,0 +1,51 @@
+import csv
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from home.models import App, Organization
+from home.memberships import MembershipError, add_members, remove_members
+from home.events import flush_events
+
+
+class Command(BaseCommand):
+    help = 'Add or remove organization / app members from a CSV file of email[,role] rows and print a per-email report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization_pk')
+        parser.add_argument('path')
+        parser.add_argument('--app', dest='apps', action='append', default=[], help='App id, can be given several times')
+        parser.add_argument('--remove', action='store_true', help='Remove the listed people instead of adding them')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Emails per transaction')
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(pk=options['organization_pk'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization_pk']} does not exist")
+        apps = [app for app in App.objects.filter(pk__in=options['apps'], organization=organization)]
+        if len(apps) != len(set(options['apps'])):
+            raise CommandError('Unknown app for this organization')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            rows = [row for row in csv.reader(stream) if row and row[0].strip()]
+        # A header row is skipped
+        if rows and rows[0][0].strip().lower() == 'email':
+            rows = rows[1:]
+        entries = [(row[0], row[1] if len(row) > 1 else None) for row in rows]
+
+        totals = Counter()
+        batch_size = options['batch_size']
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            try:
+                if options['remove']:
+                    report = remove_members(organization, [email for email, role in batch], apps)
+                else:
+                    report = add_members(organization, batch, apps)
+            except MembershipError as error:
+                raise CommandError(str(error))
+            # No request finishes here to write the buffered events
+            flush_events()
+            for line in report:
+                totals[line['result']] += 1
+                self.stdout.write(f"{line['email']},{line['result']},{line['detail']}")
+        self.stdout.write(self.style.SUCCESS(', '.join(f'{total} {result}' for result, total in sorted(totals.items()))))
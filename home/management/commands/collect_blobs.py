@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from home.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored blobs that no record file has used for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage(timedelta(hours=options['grace_hours']))
+        self.stdout.write(self.style.SUCCESS(f'{deleted} blobs deleted'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from home.exporter import EXPORT_FORMATS
+from home.models import List
+
+
+class Command(BaseCommand):
+    help = 'Export the active records of a list as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('list_pk')
+        parser.add_argument('--format', dest='file_format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', default=None, help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            list = List.objects.get(pk=options['list_pk'])
+        except List.DoesNotExist:
+            raise CommandError(f"List {options['list_pk']} does not exist")
+
+        export, content_type = EXPORT_FORMATS[options['file_format']]
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(export(list))
+        else:
+            for chunk in export(list):
+                self.stdout.write(chunk, ending='')
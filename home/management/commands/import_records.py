@@ -0,0 +1,50 @@
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from home.importer import RecordImporter, RecordImportError
+from home.models import List
+
+
+class Command(BaseCommand):
+    help = 'Import records into a list from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('list_pk')
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'], default=None,
+                            help='Defaults to the file extension')
+        parser.add_argument('--user', dest='username', default=None, help='Username recorded as the creator')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-row', type=int, default=0,
+                            help='Skip this many data rows, used to resume an interrupted import')
+
+    def handle(self, *args, **options):
+        try:
+            list = List.objects.get(pk=options['list_pk'])
+        except List.DoesNotExist:
+            raise CommandError(f"List {options['list_pk']} does not exist")
+
+        user = None
+        if options['username']:
+            user = User.objects.get(username=options['username'])
+
+        file_format = options['file_format']
+        if file_format is None:
+            file_format = 'jsonl' if os.path.splitext(options['path'])[1].lower() in ['.jsonl', '.json'] else 'csv'
+
+        def progress(rows_done, imported):
+            self.stdout.write(f'{rows_done} rows committed, {imported} records imported')
+
+        importer = RecordImporter(list, user=user, batch_size=options['batch_size'], progress=progress)
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            try:
+                result = importer.run(stream, file_format=file_format, start_row=options['start_row'])
+            except RecordImportError as e:
+                raise CommandError(str(e))
+            except Exception:
+                self.stderr.write('Import stopped, resume with --start-row set to the last "rows committed" value above')
+                raise
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done, {result['imported']} records imported, {result['skipped']} empty rows skipped"))
@@ -0,0 +1,43 @@
+import os
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from home.models import RecordFile
+from home.blobs import store_file
+
+
+class Command(BaseCommand):
+    help = 'Move record files uploaded before blob storage into blobs, deduplicating them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--start-after', default='', help='Resume after this record file pk')
+
+    def handle(self, *args, **options):
+        last_pk = options['start_after']
+        total = 0
+        while True:
+            batch = [record_file for record_file in RecordFile.objects.filter(blob=None, pk__gt=last_pk).order_by('pk')[:options['batch_size']]]
+            if not batch:
+                break
+            for record_file in batch:
+                old_name = record_file.file.name
+                if not old_name or not default_storage.exists(old_name):
+                    continue
+                record_file.file.open('rb')
+                try:
+                    blob = store_file(record_file.file, os.path.splitext(old_name)[1])
+                finally:
+                    record_file.file.close()
+
+                record_file.blob = blob
+                record_file.file = blob.file.name
+                if record_file.thumbnail_source_image.name == old_name:
+                    record_file.thumbnail_source_image = blob.file.name
+                record_file.save(update_fields=['blob', 'file', 'thumbnail_source_image'])
+                if old_name != blob.file.name:
+                    default_storage.delete(old_name)
+                total += 1
+            last_pk = batch[-1].pk
+            self.stdout.write(f'{total} files moved (last pk {last_pk})')
+
+        self.stdout.write(self.style.SUCCESS(f'done, {total} files moved'))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from home.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Delete activity events older than the retention period, oldest first and in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        total = 0
+        while True:
+            # Ids grow with time, so each batch is the oldest id range left
+            ids = [pk for pk in Event.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:options['batch_size']]]
+            if not ids:
+                break
+            total += Event.objects.filter(id__gte=ids[0], id__lte=ids[-1], created_at__lt=cutoff).delete()[0]
+            self.stdout.write(f'{total} events deleted')
+        self.stdout.write(self.style.SUCCESS(f'{total} events deleted'))
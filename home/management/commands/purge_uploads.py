@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from home.models import FileUpload
+from home.uploads import UploadError, abort_upload
+
+
+class Command(BaseCommand):
+    help = 'Abort chunked uploads that were not completed in time and delete their stored chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        total = 0
+        for upload in FileUpload.objects.filter(status='uploading', last_updated__lt=cutoff).iterator():
+            try:
+                abort_upload(upload)
+            except UploadError:
+                # Completed or aborted in the meantime
+                continue
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'{total} uploads aborted'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from home.models import List, RecordRow
+from home.record_rows import rebuild_list_rows
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized record rows of lists with materialize_rows set, repairing any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', dest='list_pk', default=None, help='Only rebuild this list')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-after', default='', help='Resume after this record pk (with --list)')
+
+    def handle(self, *args, **options):
+        if options['list_pk']:
+            lists = List.objects.filter(pk=options['list_pk'])
+        else:
+            # Rows left behind by lists that no longer materialize are dropped too
+            lists = List.objects.filter(materialize_rows=True)
+            RecordRow.objects.exclude(list__materialize_rows=True).delete()
+
+        for list in lists:
+            def progress(total, last_pk):
+                self.stdout.write(f'{list.pk}: {total} records (last pk {last_pk})')
+
+            total = rebuild_list_rows(list, batch_size=options['batch_size'], start_after=options['start_after'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(f'{list.pk}: done, {total} records'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from home.models import Record
+from home.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents used by list search, in batches of records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--list', dest='list_pk', default=None, help='Only rebuild the documents of this list')
+        parser.add_argument('--start-after', default='', help='Resume after this record pk')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = options['start_after']
+
+        records = Record.objects.only('id', 'list_id', 'status').order_by('pk')
+        if options['list_pk']:
+            records = records.filter(list_id=options['list_pk'])
+
+        total = 0
+        while True:
+            batch = [record for record in records.filter(pk__gt=last_pk)[:batch_size]]
+            if not batch:
+                break
+
+            refresh_search_documents(batch)
+
+            total += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'Indexed {total} records (last pk {last_pk})')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} records indexed'))
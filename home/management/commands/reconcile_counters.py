@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from home.models import Organization, List
+from home.counters import refresh_member_counts, refresh_record_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the record counts of lists and the member counts of organizations and apps, repairing any drift. Meant to run periodically (cron / scheduler).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Batches by pk keep each UPDATE short so live increments are not held up
+        for model, refresh, label in [(Organization, refresh_member_counts, 'organizations'), (List, refresh_record_counts, 'lists')]:
+            last_pk = ''
+            total = 0
+            while True:
+                pks = [pk for pk in model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]]
+                if not pks:
+                    break
+                refresh(pks)
+                total += len(pks)
+                last_pk = pks[-1]
+            self.stdout.write(self.style.SUCCESS(f'{label}: {total} recounted'))
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from home.models import InactiveUsers
+from home.invites import reconcile_invites
+
+
+class Command(BaseCommand):
+    help = 'Turn the pending invites of already active users into memberships (users activated before invites were reconciled on activation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--start-after', type=int, default=0, help='Resume after this user id')
+
+    def handle(self, *args, **options):
+        invited = InactiveUsers.objects.filter(user_email__isnull=False).values('user_email')
+        users = User.objects.filter(is_active=True, email__in=invited).order_by('pk')
+
+        last_pk = options['start_after']
+        total = 0
+        while True:
+            batch = [user for user in users.filter(pk__gt=last_pk).only('pk', 'email', 'is_active')[:options['batch_size']]]
+            if not batch:
+                break
+            total += reconcile_invites(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'{total} invites reconciled, last user {last_pk}')
+        self.stdout.write(self.style.SUCCESS(f'{total} invites reconciled'))
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from home.models import RecordFile
+
+
+def _regenerate(record_file_pk, force):
+    # Runs in a worker process, which opens its own database connection
+    from home.thumbnails import generate_thumbnails
+    record_file = RecordFile.objects.filter(pk=record_file_pk).first()
+    if record_file is None:
+        return False
+    return generate_thumbnails(record_file, force=force) is not None
+
+
+class Command(BaseCommand):
+    help = 'Render the thumbnail variants of record files, spread over a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also files that already have thumbnails')
+        parser.add_argument('--force', action='store_true', help='Render again even when the variants exist')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        record_files = RecordFile.objects.exclude(thumbnail_source_image='').exclude(thumbnail_source_image=None)
+        if not options['all']:
+            record_files = record_files.filter(thumbnail_hash='')
+        pks = [pk for pk in record_files.order_by('pk').values_list('pk', flat=True)]
+
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+
+        total = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for start in range(0, len(pks), options['batch_size']):
+                batch = pks[start:start + options['batch_size']]
+                total += sum(executor.map(_regenerate, batch, [options['force']] * len(batch)))
+                self.stdout.write(f'{start + len(batch)}/{len(pks)} files')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} files have thumbnails'))
@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from django.core.management.base import BaseCommand
+from django.db import connections
+from home.jobs import run_pending_jobs
+
+
+def _work(batch_size, sleep, once, log=None):
+    # One worker loop; several of them can run side by side since jobs are
+    # claimed with SKIP LOCKED
+    total = 0
+    while True:
+        done = run_pending_jobs(batch_size)
+        total += done
+        if done:
+            if log is not None:
+                log(f'{done} jobs run')
+            continue
+        if once:
+            return total
+        time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (media processing, ...). Keeps polling unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes, e.g. one per core for video processing')
+
+    def handle(self, *args, **options):
+        arguments = (options['batch_size'], options['sleep'], options['once'])
+        if options['workers'] <= 1:
+            _work(*arguments, log=self.stdout.write)
+            return
+
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(_work, *arguments) for _ in range(options['workers'])]
+            wait(futures)
+        self.stdout.write(f'{sum(future.result() for future in futures)} jobs run')
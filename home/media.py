@@ -0,0 +1,63 @@
+import os
+import shutil
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from .models import RecordFile
+from .thumbnails import generate_thumbnails
+from .fragments import bump_record
+
+
+@contextmanager
+def local_copy(field_file):
+
+    # Yields a path on local disk for a stored file: the file itself with
+    # FileSystemStorage, otherwise a temporary copy streamed from the backend
+    # (e.g. S3) which is removed afterwards
+
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        # Outside the try, errors from the caller's block must not be taken
+        # for storage without local paths
+        yield path
+        return
+
+    suffix = os.path.splitext(field_file.name)[1]
+    with NamedTemporaryFile(suffix=suffix) as temp:
+        field_file.open('rb')
+        try:
+            shutil.copyfileobj(field_file, temp, 1024 * 1024)
+        finally:
+            field_file.close()
+        temp.flush()
+        yield temp.name
+
+
+def process_record_file(record_file_pk):
+
+    # Job run after an upload: detects the type, extracts the video frame,
+    # and renders the thumbnail variants, tracking progress on the RecordFile
+
+    record_file = RecordFile.objects.filter(pk=record_file_pk).first()
+    if record_file is None:
+        # Deleted before the worker got to it
+        return
+
+    RecordFile.objects.filter(pk=record_file.pk).update(processing_status=RecordFile.PROCESSING)
+    try:
+        if not record_file.type:
+            # Chunked uploads already sniffed the type from their first chunk
+            record_file._set_type()
+        record_file._set_thumbnail_source_image()
+        generate_thumbnails(record_file)
+    except Exception as error:
+        RecordFile.objects.filter(pk=record_file.pk).update(processing_status=RecordFile.FAILED, processing_error=str(error))
+        bump_record(record_file.record_id)
+        raise
+
+    record_file.processing_status = RecordFile.READY
+    record_file.processing_error = ''
+    record_file.save(update_fields=['type', 'thumbnail_source_image', 'thumbnail_hash', 'preview_strip', 'duration', 'width', 'height', 'processing_status', 'processing_error'])
+    bump_record(record_file.record_id)
@@ -0,0 +1,199 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from .models import Event, Organization, OrganizationUser, InactiveUsers
+from .counters import refresh_member_counts
+from .permissions import invalidate_permissions
+from .events import log_event
+
+
+# Membership changes for many people at once (bulk_members endpoint and
+# command). Each call runs in one transaction with a fixed number of queries
+# whatever the number of emails: users are resolved in one query, missing
+# rows are bulk inserted and permitted apps are written straight to the
+# through tables. Every email gets a line in the returned report.
+
+ROLES = [role for role, label in OrganizationUser.ORGANIZATION_USER_ROLE]
+DEFAULT_ROLE = 'user'
+
+
+class MembershipError(Exception):
+    pass
+
+
+def _report(email, result, detail=''):
+    return {'email': email, 'result': result, 'detail': detail}
+
+
+def _clean(entries):
+    # [(email, role)] -> {email: role} for the valid ones plus report lines
+    # for the others. A missing role keeps the current one (new members get
+    # DEFAULT_ROLE).
+    members = {}
+    report = []
+    for email, role in entries:
+        email = (email or '').strip()
+        role = (role or '').strip().lower() or None
+        try:
+            validate_email(email)
+        except ValidationError:
+            report.append(_report(email, 'invalid', 'Not a valid email address'))
+            continue
+        if role is not None and role not in ROLES:
+            report.append(_report(email, 'invalid', f'Unknown role {role}'))
+            continue
+        if email in members:
+            report.append(_report(email, 'duplicate', 'Listed more than once, the first entry is used'))
+            continue
+        members[email] = role
+    return members, report
+
+
+def _users_by_email(emails):
+    users = {}
+    for pk, email in User.objects.filter(email__in=emails).order_by('pk').values_list('pk', 'email'):
+        users.setdefault(email, pk)
+    return users
+
+
+def _organization_users(organization, user_pks):
+    # The first OrganizationUser of each user is the one views use
+    organization_users = {}
+    for organization_user in OrganizationUser.objects.filter(organization=organization, user_id__in=user_pks).order_by('pk'):
+        organization_users.setdefault(organization_user.user_id, organization_user)
+    return organization_users
+
+
+def _invites(emails):
+    invites = {}
+    for pk, email in InactiveUsers.objects.filter(user_email__in=emails).order_by('pk').values_list('pk', 'user_email'):
+        invites.setdefault(email, pk)
+    return invites
+
+
+def _finish(organization, actor, verb, report, app_ids, granted=None):
+    refresh_member_counts([organization.pk])
+    transaction.on_commit(lambda: invalidate_permissions(organization.pk))
+    done = [line['email'] for line in report if line['result'] in ['added', 'reactivated', 'updated', 'granted', 'invited', 'removed']]
+    # App level changes are logged once per app, so they show in each app's
+    # activity feed. granted maps emails to the apps they newly got.
+    granted = granted or {}
+    for email in done:
+        for app_id in granted.get(email, app_ids) or [None]:
+            log_event(verb, organization.pk, app_id, user=actor, data={'email': email})
+
+
+def add_members(organization, entries, apps=(), actor=None):
+
+    # Adds (email, role) entries to the organization, and to apps if given.
+    # People without an account are invited, they get the organization and
+    # apps once they sign up (home/invites.py); invites carry no role.
+
+    members, report = _clean(entries)
+    app_ids = [app.pk for app in apps]
+    if any(app.organization_id != organization.pk for app in apps):
+        raise MembershipError('Apps must belong to the organization')
+    if not members:
+        return report
+
+    with transaction.atomic():
+        users = _users_by_email(members.keys())
+        organization_users = _organization_users(organization, users.values())
+
+        new_members = []
+        changed_members = []
+        results = {}
+        for email, user_pk in users.items():
+            role = members[email]
+            organization_user = organization_users.get(user_pk)
+            if organization_user is None:
+                new_members.append(OrganizationUser(user_id=user_pk, organization=organization, role=role or DEFAULT_ROLE, status='active'))
+                results[email] = _report(email, 'added')
+            elif organization_user.status != 'active' or (role is not None and organization_user.role != role):
+                results[email] = _report(email, 'reactivated' if organization_user.status != 'active' else 'updated')
+                organization_user.status = 'active'
+                organization_user.role = role or organization_user.role
+                changed_members.append(organization_user)
+            else:
+                results[email] = _report(email, 'unchanged')
+        OrganizationUser.objects.bulk_create(new_members)
+        OrganizationUser.objects.bulk_update(changed_members, ['status', 'role'])
+
+        granted = {}
+        if app_ids and users:
+            if new_members:
+                organization_users = _organization_users(organization, users.values())
+            permitted_apps = OrganizationUser.permitted_apps.through
+            # Only the apps members don't have yet are granted, reported and
+            # logged
+            existing = set(permitted_apps.objects.filter(
+                organizationuser_id__in=[organization_user.pk for organization_user in organization_users.values()],
+                app_id__in=app_ids).values_list('organizationuser_id', 'app_id'))
+            new_grants = []
+            for email, user_pk in users.items():
+                organization_user = organization_users[user_pk]
+                new_app_ids = [app_id for app_id in app_ids if (organization_user.pk, app_id) not in existing]
+                if not new_app_ids:
+                    continue
+                granted[email] = new_app_ids
+                new_grants += [permitted_apps(organizationuser_id=organization_user.pk, app_id=app_id) for app_id in new_app_ids]
+                if results[email]['result'] == 'unchanged':
+                    results[email] = _report(email, 'granted', f'Given access to {len(new_app_ids)} app(s)')
+            permitted_apps.objects.bulk_create(new_grants, ignore_conflicts=True)
+
+        invite_emails = [email for email in members if email not in users]
+        if invite_emails:
+            invites = _invites(invite_emails)
+            InactiveUsers.objects.bulk_create([InactiveUsers(user_email=email) for email in invite_emails if email not in invites])
+            invites = _invites(invite_emails)
+            Organization.inactive_users.through.objects.bulk_create(
+                [Organization.inactive_users.through(organization_id=organization.pk, inactiveusers_id=invite_pk) for invite_pk in invites.values()],
+                ignore_conflicts=True)
+            if app_ids:
+                attached_workspaces = InactiveUsers.attached_workspaces.through
+                attached_workspaces.objects.bulk_create(
+                    [attached_workspaces(inactiveusers_id=invite_pk, app_id=app_id) for invite_pk in invites.values() for app_id in app_ids],
+                    ignore_conflicts=True)
+            for email in invite_emails:
+                results[email] = _report(email, 'invited', 'No account yet, access is granted on sign up')
+
+        report += [results[email] for email in members]
+        _finish(organization, actor, Event.MEMBER_ADDED, report, app_ids, granted)
+    return report
+
+
+def remove_members(organization, emails, apps=(), actor=None):
+
+    # With apps, takes those apps away from the people listed; without, takes
+    # them out of the organization. Invites are updated the same way.
+
+    members, report = _clean([(email, None) for email in emails])
+    app_ids = [app.pk for app in apps]
+    if any(app.organization_id != organization.pk for app in apps):
+        raise MembershipError('Apps must belong to the organization')
+    if not members:
+        return report
+
+    with transaction.atomic():
+        users = _users_by_email(members.keys())
+        organization_users = _organization_users(organization, users.values())
+        invites = _invites([email for email in members if email not in users])
+        organization_invites = set(Organization.inactive_users.through.objects.filter(organization_id=organization.pk, inactiveusers_id__in=invites.values())
+                                   .values_list('inactiveusers_id', flat=True))
+
+        organization_user_pks = [organization_user.pk for organization_user in organization_users.values() if organization_user.status == 'active']
+        invite_pks = [invite_pk for invite_pk in invites.values() if invite_pk in organization_invites]
+        if app_ids:
+            OrganizationUser.permitted_apps.through.objects.filter(organizationuser_id__in=organization_user_pks, app_id__in=app_ids).delete()
+            InactiveUsers.attached_workspaces.through.objects.filter(inactiveusers_id__in=invite_pks, app_id__in=app_ids).delete()
+        else:
+            OrganizationUser.objects.filter(pk__in=organization_user_pks).update(status='deleted')
+            Organization.inactive_users.through.objects.filter(organization_id=organization.pk, inactiveusers_id__in=invite_pks).delete()
+
+        for email in members:
+            found = (email in users and organization_users.get(users[email]) is not None and organization_users[users[email]].status == 'active') \
+                or invites.get(email) in organization_invites
+            report.append(_report(email, 'removed') if found else _report(email, 'not_found', 'Not a member of the organization'))
+        _finish(organization, actor, Event.MEMBER_REMOVED, report, app_ids)
+    return report
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordfield',
+            name='value_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recordfield',
+            name='value_number',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=30, null=True),
+        ),
+        migrations.AddField(
+            model_name='recordfield',
+            name='value_text',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recordfield',
+            index=models.Index(fields=['list_field', 'value_number'], name='recordfield_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordfield',
+            index=models.Index(fields=['list_field', 'value_date'], name='recordfield_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordfield',
+            index=models.Index(fields=['list_field', 'value_text'], name='recordfield_text_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:48
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_recordfield_typed_values'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='RecordSearchDocument',
+            fields=[
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='home.record')),
+                ('primary_value', models.TextField(default='')),
+                ('document', models.TextField(default='')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='home.list')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recordsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recordsearch_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['document'], name='recordsearch_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
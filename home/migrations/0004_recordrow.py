@@ -0,0 +1,30 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_recordsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='materialize_rows',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RecordRow',
+            fields=[
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='row', serialize=False, to='home.record')),
+                ('primary_value', models.TextField(null=True)),
+                ('values', models.JSONField(default=dict)),
+                ('selected_records', models.JSONField(default=dict)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='record_rows', to='home.list')),
+            ],
+        ),
+    ]
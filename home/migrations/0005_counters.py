@@ -0,0 +1,54 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, outer_field, outer_ref='pk'):
+    counts = queryset.filter(**{outer_field: OuterRef(outer_ref)}).order_by() \
+        .values(outer_field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    # Set-based, one UPDATE per table; reconcile_counters does the same later
+    Organization = apps.get_model('home', 'Organization')
+    OrganizationUser = apps.get_model('home', 'OrganizationUser')
+    InactiveUsers = apps.get_model('home', 'InactiveUsers')
+    App = apps.get_model('home', 'App')
+    List = apps.get_model('home', 'List')
+    Record = apps.get_model('home', 'Record')
+
+    active_users = OrganizationUser.objects.filter(status='active')
+    Organization.objects.update(
+        member_count=_count(active_users, 'organization') + _count(Organization.inactive_users.through.objects.all(), 'organization'))
+    App.objects.update(
+        member_count=_count(active_users, 'organization', 'organization') + _count(InactiveUsers.attached_workspaces.through.objects.all(), 'app'))
+    List.objects.update(record_count=_count(Record.objects.filter(status='active'), 'list'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0004_recordrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='app',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='record_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
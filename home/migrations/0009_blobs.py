@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import home.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recordfile',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=home.models.record_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['ref_count', 'released_at'], name='blob_gc_idx'),
+        ),
+        migrations.AddField(
+            model_name='recordfile',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='record_files', to='home.blob'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordfile',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recordfile',
+            name='height',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recordfile',
+            name='preview_strip',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to='post_files/%Y/%m/%d/'),
+        ),
+        migrations.AddField(
+            model_name='recordfile',
+            name='width',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:30
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def fill_primary_search(apps, schema_editor):
+    RecordSearchDocument = apps.get_model('home', 'RecordSearchDocument')
+    RecordSearchDocument.objects.update(primary_search=Lower('primary_value'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_video_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordsearchdocument',
+            name='primary_search',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(fill_primary_search, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recordsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['primary_search'], name='recordsearch_primary_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_recordsearch_primary_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recordrelation',
+            index=models.Index(fields=['child_record', 'status', 'parent_record'], name='relation_child_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordrelation',
+            index=models.Index(fields=['parent_record', 'list_field', 'status', 'child_record'], name='relation_parent_idx'),
+        ),
+    ]
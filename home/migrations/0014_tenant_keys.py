@@ -0,0 +1,105 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+# A copy of home.tenants.backfill_tenant_keys as it was when this migration
+# was written, so later changes there can't change what this migration does
+
+BATCH_SIZE = 1000
+
+TENANT_TABLES = [
+    ('List', 'app', 'App', ['organization']),
+    ('Record', 'list', 'List', ['app', 'organization']),
+    ('RecordField', 'record', 'Record', ['app', 'organization']),
+    ('RecordRelation', 'parent_record', 'Record', ['app', 'organization']),
+]
+
+
+def fill_tenant_keys(apps, schema_editor):
+    for model_name, via, source_name, keys in TENANT_TABLES:
+        model = apps.get_model('home', model_name)
+        source = apps.get_model('home', source_name)
+        values = {f'{key}_id': Subquery(source.objects.filter(pk=OuterRef(f'{via}_id')).values(f'{key}_id')[:1]) for key in keys}
+        rows = model.objects.filter(organization_id__isnull=True, **{f'{via}_id__isnull': False}).order_by('pk')
+        last_pk = ''
+        while True:
+            pks = [pk for pk in rows.filter(pk__gt=last_pk).values_list('pk', flat=True)[:BATCH_SIZE]]
+            if not pks:
+                break
+            model.objects.filter(pk__in=pks).update(**values)
+            last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    # Runs online: the columns are nullable without a default (no table
+    # rewrite), the backfill commits batch by batch and the indexes are
+    # built concurrently once it is done, which needs a non-atomic migration
+    atomic = False
+
+    dependencies = [
+        ('home', '0013_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='organization',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.organization'),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='app',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.app'),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='organization',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.organization'),
+        ),
+        migrations.AddField(
+            model_name='recordfield',
+            name='app',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.app'),
+        ),
+        migrations.AddField(
+            model_name='recordfield',
+            name='organization',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.organization'),
+        ),
+        migrations.AddField(
+            model_name='recordrelation',
+            name='app',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.app'),
+        ),
+        migrations.AddField(
+            model_name='recordrelation',
+            name='organization',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='home.organization'),
+        ),
+        migrations.RunPython(fill_tenant_keys, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='list',
+            index=models.Index(fields=['app', 'status', 'name'], name='list_app_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='list',
+            index=models.Index(fields=['organization', 'status', 'name'], name='list_organization_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='record',
+            index=models.Index(fields=['list', 'status', 'created_at'], name='record_list_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='record',
+            index=models.Index(fields=['app', 'status', 'created_at'], name='record_app_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recordfield',
+            index=models.Index(fields=['record', 'list_field', 'status'], name='recordfield_record_idx'),
+        ),
+    ]
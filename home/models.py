@@ -9,13 +9,60 @@ from django.db.models import JSONField
 import os
 from django.conf import settings
 from django.db import models
-from imagekit.processors import ResizeToFit
-from imagekit.models import ImageSpecField
-from .utils import save_frame_from_video
 import string
 import random
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_save, m2m_changed
 from django.dispatch import receiver
+from django.utils.dateparse import parse_date
+from decimal import Decimal, InvalidOperation, localcontext
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+
+class TenantScopeError(Exception):
+    pass
+
+
+class TenantManager(models.Manager):
+
+    # The scoped manager of the tables carrying organization / app keys:
+    # Record.scoped.for_tenant(organization_pk, app_pk).get(pk=...) filters
+    # on the row's own keys instead of joining up through list -> app ->
+    # organization. Unscoped queries raise, so tenant facing code can't drop
+    # the filter by accident; objects stays the plain default manager.
+    #
+    # Rows written before the keys existed are filled by migration 0014 and
+    # the backfill_tenant_keys command. Only while that runs during a deploy,
+    # settings.TENANT_KEYS_FALLBACK also matches rows still missing them
+    # through the join along app_path, which leads from the model to its App.
+
+    def __init__(self, app_path):
+        super().__init__()
+        self.app_path = app_path
+
+    def get_queryset(self):
+        raise TenantScopeError(f'{self.model.__name__}.scoped needs for_organization(), for_app() or for_tenant()')
+
+    def _organization(self, organization_id):
+        if not getattr(settings, 'TENANT_KEYS_FALLBACK', False):
+            return models.Q(organization_id=organization_id)
+        return models.Q(organization_id=organization_id) | \
+            models.Q(organization_id__isnull=True, **{f'{self.app_path}__organization_id': organization_id})
+
+    def _app(self, app_id):
+        if self.app_path == 'app' or not getattr(settings, 'TENANT_KEYS_FALLBACK', False):
+            return models.Q(app_id=app_id)
+        return models.Q(app_id=app_id) | models.Q(app_id__isnull=True, **{f'{self.app_path}_id': app_id})
+
+    def for_organization(self, organization_id):
+        return super().get_queryset().filter(self._organization(organization_id))
+
+    def for_app(self, app_id):
+        return super().get_queryset().filter(self._app(app_id))
+
+    def for_tenant(self, organization_id, app_id):
+        # For views under organizations/<organization_pk>/apps/<app_pk>/
+        return super().get_queryset().filter(self._organization(organization_id)).filter(self._app(app_id))
 
 
 class Organization(models.Model):
@@ -39,12 +86,13 @@ class Organization(models.Model):
         default='active',
     )
 
+    # Active plus invited users, maintained by home/counters.py
+    member_count = models.PositiveIntegerField(default=0)
+
     # TODO add @property for organization users
 
     def membersCount(self):
-        active_users = OrganizationUser.objects.filter(organization=self,status="active").count()
-        inactive_users = self.inactive_users.all().count()
-        return active_users + inactive_users
+        return self.member_count
 
     #memberscount = property(MembersCount)
 
@@ -113,10 +161,12 @@ class App(models.Model):
     def __str__(self):
         return self.name
 
+    # Active users of the organization plus users invited to the app,
+    # maintained by home/counters.py
+    member_count = models.PositiveIntegerField(default=0)
+
     def membersCount(self):
-        active_users = OrganizationUser.objects.filter(organization = self.organization,status='active').count()
-        inactive_users = InactiveUsers.objects.filter(attached_workspaces = self).count()
-        return active_users + inactive_users
+        return self.member_count
 
 
 class AppUser(models.Model):
@@ -153,6 +203,8 @@ class List(models.Model):
     id = models.CharField(primary_key=True, default='', editable=False,max_length=16)
     name = models.CharField(max_length=200)
     app = models.ForeignKey('App', on_delete=models.SET_NULL, null=True)
+    # Copy of app.organization (see TenantManager), filled by home/tenants.py
+    organization = models.ForeignKey('Organization', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True, null=False)
     created_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     last_updated = models.DateTimeField(auto_now_add=True)
@@ -170,6 +222,21 @@ class List(models.Model):
         default='active',
     )
 
+    # Keep one denormalized RecordRow per record for this list, see home/record_rows.py
+    materialize_rows = models.BooleanField(default=False)
+
+    # Active records, maintained by home/counters.py
+    record_count = models.PositiveIntegerField(default=0)
+
+    objects = models.Manager()
+    scoped = TenantManager('app')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['app', 'status', 'name'], name='list_app_idx'),
+            models.Index(fields=['organization', 'status', 'name'], name='list_organization_idx'),
+        ]
+
     @property
     def list_fields(self):
         # return ListField.objects.filter(list=self, status='active').order_by('order') \
@@ -181,7 +248,7 @@ class List(models.Model):
 
     @property
     def total_record(self):
-        return Record.objects.filter(list=self, status="active").count()
+        return self.record_count
 
     def __str__(self):
         return self.name
@@ -244,6 +311,9 @@ class ListField(models.Model):
 class Record(models.Model):
     id = models.CharField(primary_key=True, default='', editable=False,max_length=16)
     list = models.ForeignKey('List', on_delete=models.SET_NULL, null=True)
+    # Copies of list.app and list.app.organization (see TenantManager)
+    app = models.ForeignKey('App', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    organization = models.ForeignKey('Organization', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True, null=False)
     created_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     last_updated = models.DateTimeField(auto_now_add=True)
@@ -261,6 +331,16 @@ class Record(models.Model):
         default='active',
     )
 
+    objects = models.Manager()
+    scoped = TenantManager('list__app')
+
+    class Meta:
+        # (list, status, created_at) is the order records are shown in
+        indexes = [
+            models.Index(fields=['list', 'status', 'created_at'], name='record_list_idx'),
+            models.Index(fields=['app', 'status', 'created_at'], name='record_app_idx'),
+        ]
+
     @property
     def record_fields(self):
         return RecordField.objects.filter(record=self, status='active', list_field__status="active") \
@@ -285,6 +365,9 @@ class RecordField(models.Model):
     list_field = models.ForeignKey('ListField', on_delete=models.SET_NULL, null=True)
     value = models.TextField(null=True)
     selected_record = models.ForeignKey('Record', on_delete=models.SET_NULL, null=True, related_name='selected_record')
+    # Copies of record.app and record.organization (see TenantManager)
+    app = models.ForeignKey('App', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    organization = models.ForeignKey('Organization', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True, null=False)
     created_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     last_updated = models.DateTimeField(auto_now_add=True)
@@ -302,15 +385,110 @@ class RecordField(models.Model):
         default='active',
     )
 
+    # Typed copies of value, kept in step with it by set_typed_values() so that
+    # number / date / rating fields can be sorted and range filtered natively
+    value_number = models.DecimalField(max_digits=30, decimal_places=10, null=True, blank=True)
+    value_date = models.DateField(null=True, blank=True)
+    value_text = models.CharField(max_length=255, null=True, blank=True)
+
+    NUMBER_FIELD_TYPES = ['number', 'rating']
+    DATE_FIELD_TYPES = ['date']
+
+    objects = models.Manager()
+    scoped = TenantManager('record__list__app')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['record', 'list_field', 'status'], name='recordfield_record_idx'),
+            models.Index(fields=['list_field', 'value_number'], name='recordfield_number_idx'),
+            models.Index(fields=['list_field', 'value_date'], name='recordfield_date_idx'),
+            models.Index(fields=['list_field', 'value_text'], name='recordfield_text_idx'),
+        ]
+
+    def set_typed_values(self, field_type=None):
+        # field_type can be passed in when the list field is not loaded yet
+        if field_type is None:
+            field_type = self.list_field.field_type if self.list_field_id else None
+
+        value = self.value.strip() if self.value is not None else ''
+
+        self.value_number = None
+        self.value_date = None
+        self.value_text = value.lower()[:255] if value else None
+
+        if not value:
+            return
+
+        if field_type in self.NUMBER_FIELD_TYPES:
+            try:
+                number = Decimal(value.replace(',', ''))
+                # Skip NaN / Infinity and anything too large for the column,
+                # checked once rounded. Quantized it has up to 30 digits, more
+                # than the default context's 28
+                if number.is_finite() and abs(number) < Decimal(10) ** 21:
+                    with localcontext() as context:
+                        context.prec = 40
+                        number = number.quantize(Decimal(1).scaleb(-10))
+                    if abs(number) < Decimal(10) ** 20:
+                        self.value_number = number
+            except (InvalidOperation, ValueError):
+                pass
+        elif field_type in self.DATE_FIELD_TYPES:
+            try:
+                self.value_date = parse_date(value[:10])
+            except ValueError:
+                pass
+
     def __str__(self):
         return str(self.id)
 
 
+class RecordSearchDocument(models.Model):
+    # One row per active record holding the text that list search runs against,
+    # kept up to date by home.search.update_search_document()
+    record = models.OneToOneField('Record', on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    list = models.ForeignKey('List', on_delete=models.CASCADE, related_name='search_documents')
+    primary_value = models.TextField(default='')
+    # Lowercased primary_value, for the choose-from-list lookups (home.options)
+    primary_search = models.TextField(default='')
+    document = models.TextField(default='')
+    search_vector = SearchVectorField(null=True)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recordsearch_vector_idx'),
+            GinIndex(fields=['document'], name='recordsearch_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['primary_search'], name='recordsearch_primary_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return str(self.record_id)
+
+
+class RecordRow(models.Model):
+    # Materialized "wide row" of a record for lists with materialize_rows set:
+    # every active field value keyed by field_id, so reads don't have to pivot
+    # RecordField rows. Kept up to date by home.record_rows.
+    record = models.OneToOneField('Record', on_delete=models.CASCADE, primary_key=True, related_name='row')
+    list = models.ForeignKey('List', on_delete=models.CASCADE, related_name='record_rows')
+    primary_value = models.TextField(null=True)
+    values = JSONField(default=dict)
+    selected_records = JSONField(default=dict)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.record_id)
+
+
 class RecordRelation(models.Model):
     id = models.CharField(primary_key=True, default='', editable=False,max_length=16)
     parent_record = models.ForeignKey('Record', on_delete=models.SET_NULL, null=True, related_name='parent_record')
     child_record = models.ForeignKey('Record', on_delete=models.SET_NULL, null=True, related_name='child_record')
     list_field = models.ForeignKey('ListField', on_delete=models.SET_NULL, null=True, related_name='list_field')
+    # Copies of parent_record.app and parent_record.organization (see TenantManager)
+    app = models.ForeignKey('App', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    organization = models.ForeignKey('Organization', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
     created_at = models.DateTimeField(auto_now_add=True, null=False)
     created_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     last_updated = models.DateTimeField(auto_now_add=True)
@@ -341,6 +519,17 @@ class RecordRelation(models.Model):
         default='active',
     )
 
+    objects = models.Manager()
+    scoped = TenantManager('parent_record__list__app')
+
+    class Meta:
+        # The far end of the link is the last column, so walking the graph
+        # (home.relations) in either direction reads the index only
+        indexes = [
+            models.Index(fields=['child_record', 'status', 'parent_record'], name='relation_child_idx'),
+            models.Index(fields=['parent_record', 'list_field', 'status', 'child_record'], name='relation_parent_idx'),
+        ]
+
     def __str__(self):
         return str(self.id)
 
@@ -349,9 +538,32 @@ def record_file_path(self, filename):
     return os.path.join(new_path, filename)
 
 
+class Blob(models.Model):
+    # One stored content, shared by every RecordFile with the same SHA-256
+    # and counted by ref_count, see home/blobs.py
+    sha256 = models.CharField(primary_key=True, max_length=64)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When ref_count last dropped to 0, the garbage collector waits a while
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'released_at'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+
 class RecordFile(models.Model):
     id = models.CharField(primary_key=True, default='', editable=False,max_length=16)
-    file = models.FileField(upload_to=record_file_path)
+    # For files stored as blobs this is the blob's storage name, files from
+    # before blobs still live under record_file_path
+    file = models.FileField(upload_to=record_file_path, max_length=255)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='record_files')
     record = models.ForeignKey(Record,on_delete=models.CASCADE,related_name="files")
     created_at = models.DateTimeField(auto_now_add=True)
     created_user = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.CASCADE,null=True)
@@ -377,6 +589,15 @@ class RecordFile(models.Model):
             'record_file_pk':self.pk
             })
 
+    def download_url(self):
+        return reverse('download_record_file', kwargs={
+            'organization_pk':self.record.list.app.organization.pk,
+            'list_pk':self.record.list.pk,
+            'app_pk':self.record.list.app.pk,
+            'record_pk':self.record.pk,
+            'record_file_pk':self.pk
+            })
+
     def edit_url(self):
         return reverse('edit_record_file', kwargs={
             'organization_pk':self.record.list.app.organization.pk,
@@ -404,22 +625,46 @@ class RecordFile(models.Model):
     thumbnail_millisecond = models.IntegerField(default=0)
     type = models.CharField(max_length=1, choices=TYPES, blank=True)
     thumbnail_source_image = models.ImageField(upload_to='post_files/%Y/%m/%d/', null=True, blank=True)
-    image_thumbnail = ImageSpecField(source='thumbnail_source_image',
-                                     processors=[
-                                         ResizeToFit(700,
-                                                     394,
-                                                     mat_color=(0,0,0)),
-                                     ],
-                                     format='JPEG',
-                                     options={'quality': 95})
+    # SHA-256 of thumbnail_source_image, the key of its Thumbnail variants
+    thumbnail_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # Videos only, filled by home.video.process_video
+    preview_strip = models.FileField(upload_to='post_files/%Y/%m/%d/', max_length=255, null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+
+    # Uploads are stored as they come in; type detection and thumbnails are
+    # done afterwards by home.media.process_record_file in the job worker
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    PROCESSING_STATUS = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS, default=PENDING)
+    processing_error = models.TextField(blank=True, default='')
+
+    @property
+    def has_preview(self):
+        return self.processing_status == self.READY and self.type in [self.IMAGE, self.VIDEO] and bool(self.thumbnail_source_image)
 
     def _set_type(self):
-        # max bytes to read for file type detection
-        read_size = 500 * (1024 * 1024)  # 5MB
+        # libmagic only needs the first few KB to recognise a format
+        read_size = 8 * 1024
 
         # read mime type of file
         from magic import from_buffer
-        mime = from_buffer(self.file.read(read_size), mime=True)
+        self.file.open('rb')
+        try:
+            mime = from_buffer(self.file.read(read_size), mime=True)
+        finally:
+            self.file.close()
 
         if mime in self.image_types:
             self.type = self.IMAGE
@@ -430,33 +675,71 @@ class RecordFile(models.Model):
 
     def _set_thumbnail_source_image(self):
         if self.type == self.IMAGE:
-            self.thumbnail_source_image = self.file
+            self.thumbnail_source_image = self.file.name
         elif self.type == self.VIDEO:
-            # create thumbnail source file
-            image_path = os.path.splitext(self.file.path)[0] + '_thumbnail_src_image.jpg'
-            save_frame_from_video(self.file.path, int(self.thumbnail_millisecond), image_path)
-
-            # generate path relative to media root, because this is the version that ImageField accepts
-            media_image_path = os.path.relpath(image_path, settings.MEDIA_ROOT)
-
-            self.thumbnail_source_image = media_image_path
+            # Picks a representative frame and builds the preview strip,
+            # see home/video.py
+            from .video import process_video
+            process_video(self)
         else:
             self.thumbnail_source_image=None
 
-    def save(self, *args, **kwargs):
-        if self.type == '':
-            self._set_type()
-        # if there is no source image
-        if not bool(self.thumbnail_source_image):
-            # we need to save first, for django to generate path for file in "file" field
-            super().save(*args, **kwargs)
-            self._set_thumbnail_source_image()
 
-        super().save(*args, **kwargs)
+class Thumbnail(models.Model):
+    # One pre-rendered size / format of a thumbnail source, see
+    # home/thumbnails.py. Shared by all files with the same source_hash.
+    source_hash = models.CharField(max_length=64)
+    variant = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    file = models.FileField(max_length=255)
+    width = models.IntegerField()
+    height = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source_hash', 'variant', 'format'], name='thumbnail_variant_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.source_hash} {self.variant}.{self.format}'
+
+
+class FileUpload(models.Model):
+    # A resumable chunked upload in progress, see home/uploads.py. chunks
+    # lists the [storage name, size] of every part received so far.
+    id = models.CharField(primary_key=True, default='', editable=False, max_length=16)
+    record = models.ForeignKey(Record, on_delete=models.CASCADE, related_name='uploads')
+    created_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
+    file_name = models.CharField(max_length=200)
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    chunks = JSONField(default=list)
+    file_type = models.CharField(max_length=1, choices=RecordFile.TYPES, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    record_file = models.ForeignKey(RecordFile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
 
+    UPLOAD_STATUS = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    )
 
-def randomstr():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k = N))
+    status = models.CharField(
+        max_length=25,
+        choices=UPLOAD_STATUS,
+        blank=False,
+        default='uploading',
+    )
+
+    def __str__(self):
+        return f'{self.file_name} ({self.received_size}/{self.total_size})'
+
+
+def randomstr(N=16):
+    return ''.join(random.choices(string.ascii_uppercase + string.ascii_lowercase + string.digits, k = N))
 
 class RecordComment(models.Model):
     id = models.CharField(primary_key=True, default='', editable=False,max_length=16)
@@ -491,6 +774,103 @@ class RecordComment(models.Model):
 
 
 
+class Job(models.Model):
+    # Background work queued by home.jobs and picked up by the run_jobs
+    # command. name is the dotted path of the function to call with payload.
+    name = models.CharField(max_length=200)
+    payload = JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    JOB_STATUS = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    status = models.CharField(
+        max_length=25,
+        choices=JOB_STATUS,
+        blank=False,
+        default='queued',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class Event(models.Model):
+    # Append-only activity log, written in batches through home.events and
+    # read newest first by the activity feed. Rows are kept small: the links
+    # are plain columns without database constraints or indexes of their own
+    # (events outlive what they describe, and inserts neither check other
+    # tables nor update five indexes), the verb is a small integer and data
+    # only holds what changed.
+    id = models.BigAutoField(primary_key=True)
+    organization = models.ForeignKey(Organization, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    app = models.ForeignKey(App, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    list = models.ForeignKey(List, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    record = models.ForeignKey(Record, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, null=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    RECORD_CREATED = 1
+    RECORD_UPDATED = 2
+    RECORD_ARCHIVED = 3
+    COMMENT_ADDED = 10
+    COMMENT_EDITED = 11
+    COMMENT_DELETED = 12
+    FILE_ADDED = 20
+    FILE_RENAMED = 21
+    FILE_DELETED = 22
+    MEMBER_ADDED = 30
+    MEMBER_REMOVED = 31
+    MEMBER_ROLE_CHANGED = 32
+
+    EVENT_VERB = (
+        (RECORD_CREATED, 'record-created'),
+        (RECORD_UPDATED, 'record-updated'),
+        (RECORD_ARCHIVED, 'record-archived'),
+        (COMMENT_ADDED, 'comment-added'),
+        (COMMENT_EDITED, 'comment-edited'),
+        (COMMENT_DELETED, 'comment-deleted'),
+        (FILE_ADDED, 'file-added'),
+        (FILE_RENAMED, 'file-renamed'),
+        (FILE_DELETED, 'file-deleted'),
+        (MEMBER_ADDED, 'member-added'),
+        (MEMBER_REMOVED, 'member-removed'),
+        (MEMBER_ROLE_CHANGED, 'member-role-changed'),
+    )
+
+    verb = models.PositiveSmallIntegerField(choices=EVENT_VERB)
+    data = JSONField(null=True, blank=True)
+
+    class Meta:
+        # Feeds read one app (or organization, or record) newest first, so
+        # each is a short backwards index scan whatever the table size. The
+        # BRIN index on created_at is tiny on an append-only table and serves
+        # the time range deletes of prune_events.
+        indexes = [
+            models.Index(fields=['app', '-id'], name='event_app_feed_idx'),
+            models.Index(fields=['organization', '-id'], name='event_organization_feed_idx'),
+            models.Index(fields=['record', '-id'], name='event_record_feed_idx'),
+            BrinIndex(fields=['created_at'], name='event_created_brin'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_verb_display()} ({self.pk})'
+
+
 class InactiveUsers(models.Model):
     user_email = models.EmailField(null=True)
     #attached_organizations = models.ManyToManyField(Organization)
@@ -502,21 +882,54 @@ class InactiveUsers(models.Model):
         return self.user_email
 
 
+@receiver(post_init, sender=User)
+def remember_user_was_active(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred is_active isn't loaded just for this
+    instance._was_active = bool(instance.pk) and instance.__dict__.get('is_active') is True
+
+
 @receiver(post_save, sender=User)
-def update_stock(sender, instance, **kwargs):
-    inactive_user = InactiveUsers.objects.filter(user_email=instance.email).exists()
-    if inactive_user==True:
-        inactive_user= InactiveUsers.objects.get(user_email=instance.email)
-        att_orgs = inactive_user.organization_set.all()
-        for org in att_orgs:
-            org.active_users.add(instance)
-        #instance.active_users.add(att_orgs)
-        att_workspaces = inactive_user.attached_workspaces.all()
-        for wrksps in att_workspaces:
-            org = Organization.objects.get(id = wrksps.organization.pk)
-            org.active_users.add(instance)
-            org.save()
-            org_user = OrganizationUser.objects.get_or_create(user=instance,organization_id = wrksps.organization.pk)
-            org_user[0].permitted_apps.add(wrksps)
-            org_user[0].save()
-        inactive_user.delete()
+def reconcile_invites_on_activation(sender, instance, created, update_fields=None, **kwargs):
+    # Pending invites become memberships once, when the account turns active.
+    # Logins (last_login) and profile edits don't touch them.
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    was_active = getattr(instance, '_was_active', False)
+    instance._was_active = instance.is_active
+    if instance.is_active and (created or not was_active):
+        from .invites import reconcile_invites
+        reconcile_invites([instance])
+
+
+@receiver(post_delete, sender=RecordFile)
+def release_record_file_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        from .blobs import release_blob
+        release_blob(instance.blob_id)
+
+
+@receiver([post_save, post_delete], sender=OrganizationUser)
+def invalidate_organization_user_permissions(sender, instance, **kwargs):
+    from .permissions import invalidate_permissions
+    invalidate_permissions(instance.organization_id)
+
+
+@receiver(m2m_changed, sender=OrganizationUser.permitted_apps.through)
+def invalidate_permitted_apps_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+    from .permissions import invalidate_permissions
+    # instance is the OrganizationUser, or the App when changed from that side
+    invalidate_permissions(instance.organization_id)
+
+
+@receiver(m2m_changed, sender=Organization.active_users.through)
+def invalidate_active_users_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'pre_clear']:
+        return
+    from .permissions import invalidate_permissions
+    if not reverse:
+        invalidate_permissions(instance.pk)
+    else:
+        for organization in instance.organization_set.all():
+            invalidate_permissions(organization.pk)
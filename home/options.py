@@ -0,0 +1,41 @@
+import hashlib
+from django.core.cache import cache
+from .models import RecordSearchDocument
+from .pagination import KeysetPaginator
+from .fragments import get_versions
+
+
+# Options of choose-from-list fields. Instead of rendering every record of
+# the source list into the form, the select asks for one page at a time,
+# filtered by what has been typed. Pages come from the search documents
+# (primary value prefix, trigram indexed) and are cached under the source
+# list's version stamp, which every record write already bumps.
+
+OPTION_PAGE_SIZE = 50
+OPTION_CACHE_TIMEOUT = 60 * 60
+
+
+def list_options(list, search='', token=None, per_page=OPTION_PAGE_SIZE):
+
+    # Returns {'results': [{'id': record_id, 'value': primary value}], 'next': token}
+    # ordered by primary value
+
+    search = (search or '').strip().lower()
+    version = get_versions([('list', list.pk)])[0]
+    stamp = hashlib.md5(f'{search}|{token or ""}|{per_page}'.encode()).hexdigest()
+    key = f'home:options:{list.pk}:{version}:{stamp}'
+    options = cache.get(key)
+    if options is not None:
+        return options
+
+    documents = RecordSearchDocument.objects.filter(list=list).exclude(primary_value='').only('record_id', 'primary_value')
+    if search:
+        documents = documents.filter(primary_search__startswith=search)
+
+    page = KeysetPaginator(documents, per_page, ordering=('primary_value', 'record_id')).get_page(token)
+    options = {
+        'results': [{'id': document.record_id, 'value': document.primary_value} for document in page],
+        'next': page.next_token,
+    }
+    cache.set(key, options, OPTION_CACHE_TIMEOUT)
+    return options
@@ -0,0 +1,154 @@
+import json
+from django.core import signing
+from django.db import connection
+from django.db.models import F, Q
+
+
+# Lists with fewer rows than this (by the planner's estimate) get an exact count
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def approximate_count(queryset):
+
+    # On Postgres, reads the planner's row estimate from EXPLAIN instead of
+    # running COUNT(*) over a large list. Small results are counted exactly.
+
+    if connection.vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+        except (ValueError, KeyError, IndexError, TypeError):
+            estimate = None
+        if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate
+    return queryset.count()
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_token=None, previous_token=None, count=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+
+    # Cursor based alternative to django's Paginator. Pages are found with a
+    # WHERE on the ordering columns (seek) instead of OFFSET, and no COUNT(*)
+    # is run unless asked for, so every page costs the same as the first.
+    #
+    # ordering is a list of field or annotation names (prefixed with '-' for
+    # descending) ending in a unique column, e.g. ('created_at', 'id'). Only
+    # the columns listed in nullable may be NULL; their NULLs come last in
+    # either direction, like RecordQuery's sorts. Tokens are signed, so they
+    # are opaque to clients and can't be forged, and only fit the ordering
+    # they were made for.
+
+    salt = 'home.pagination'
+
+    def __init__(self, queryset, per_page, ordering=('created_at', 'id'), nullable=()):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = [field.lstrip('-') for field in ordering]
+        self.descending = [field.startswith('-') for field in ordering]
+        self.nullable = [field in nullable for field in self.ordering]
+        self.key = ','.join(ordering)
+
+    def _encode(self, direction, row):
+        values = [getattr(row, field) for field in self.ordering]
+        return signing.dumps([direction, self.key, json.loads(json.dumps(values, default=str))], salt=self.salt, compress=True)
+
+    def _decode(self, token):
+        try:
+            direction, key, values = signing.loads(token, salt=self.salt)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None, None
+        if direction not in ['next', 'prev'] or key != self.key or len(values) != len(self.ordering):
+            return None, None
+        return direction, values
+
+    def _past(self, index, value, backwards):
+        # Rows past value in the column at index, in the direction of travel
+        field = self.ordering[index]
+        after = self.descending[index] == backwards
+        if not self.nullable[index]:
+            return Q(**{f'{field}__{"gt" if after else "lt"}': value})
+        if value is None:
+            # NULLs come last: nothing is past them going forward, every
+            # value is going back
+            return Q(pk__in=[]) if not backwards else Q(**{f'{field}__isnull': False})
+        clause = Q(**{f'{field}__{"gt" if after else "lt"}': value})
+        return clause | Q(**{f'{field}__isnull': True}) if not backwards else clause
+
+    def _equal(self, index, value):
+        field = self.ordering[index]
+        if self.nullable[index] and value is None:
+            return Q(**{f'{field}__isnull': True})
+        return Q(**{field: value})
+
+    def _seek(self, values, backwards):
+        # (a, b, c) > (x, y, z) expanded to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for index in range(len(self.ordering)):
+            clause = self._past(index, values[index], backwards)
+            for previous_index in range(index):
+                clause &= self._equal(previous_index, values[previous_index])
+            condition |= clause
+        return condition
+
+    def _order_by(self, backwards):
+        order = []
+        for field, descending, nullable in zip(self.ordering, self.descending, self.nullable):
+            descending = descending != backwards
+            if nullable:
+                column = F(field)
+                order.append(column.desc(nulls_last=not backwards, nulls_first=backwards) if descending
+                             else column.asc(nulls_last=not backwards, nulls_first=backwards))
+            else:
+                order.append(f'-{field}' if descending else field)
+        return order
+
+    def get_page(self, token=None, with_count=False):
+        direction, values = self._decode(token) if token else (None, None)
+        backwards = direction == 'prev'
+
+        queryset = self.queryset.order_by(*self._order_by(backwards))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+
+        # One extra row tells us whether there is another page in this direction
+        rows = [row for row in queryset[:self.per_page + 1]]
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_token = None
+        previous_token = None
+        if rows:
+            if has_more or backwards:
+                next_token = self._encode('next', rows[-1])
+            if (has_more and backwards) or (values is not None and not backwards):
+                previous_token = self._encode('prev', rows[0])
+
+        count = approximate_count(self.queryset) if with_count else None
+
+        return KeysetPage(rows, next_token=next_token, previous_token=previous_token, count=count)
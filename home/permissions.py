@@ -0,0 +1,112 @@
+import time
+from functools import wraps
+from django.core.cache import cache
+from django.http import HttpResponse
+from .models import OrganizationUser
+
+
+PERMISSION_CACHE_TIMEOUT = 60 * 10
+
+
+class Membership:
+
+    # A user's effective access to one organization: their role and the set
+    # of apps they were given, so app checks are a set lookup
+
+    def __init__(self, role=None, app_ids=()):
+        self.role = role
+        self.app_ids = frozenset(app_ids)
+
+    @property
+    def is_member(self):
+        return self.role is not None
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def can_access_app(self, app_pk):
+        if not self.is_member:
+            return False
+        return self.is_admin or str(app_pk) in self.app_ids
+
+
+def _version_key(organization_pk):
+    return f'home:permissions:version:{organization_pk}'
+
+
+def _permission_version(organization_pk):
+    # Versions start from the clock so an evicted version key can never bring
+    # back entries cached under an older version
+    version = cache.get(_version_key(organization_pk))
+    if version is None:
+        cache.add(_version_key(organization_pk), int(time.time() * 1000), None)
+        version = cache.get(_version_key(organization_pk))
+    return version
+
+
+def invalidate_permissions(organization_pk):
+    # Called whenever memberships or permitted apps of an organization change,
+    # every cached Membership of that organization is dropped at once
+    if organization_pk is None:
+        return
+    try:
+        cache.incr(_version_key(organization_pk))
+    except ValueError:
+        cache.set(_version_key(organization_pk), int(time.time() * 1000), None)
+
+
+def _load_membership(user, organization_pk):
+    rows = OrganizationUser.objects.filter(organization_id=organization_pk, user=user, status='active') \
+        .order_by('pk') \
+        .values_list('pk', 'role', 'permitted_apps')
+
+    # Views have always used the first matching OrganizationUser
+    org_user_pk = None
+    role = None
+    app_ids = []
+    for pk, row_role, app_id in rows:
+        if org_user_pk is None:
+            org_user_pk, role = pk, row_role
+        if pk == org_user_pk and app_id is not None:
+            app_ids.append(app_id)
+    return Membership(role=role, app_ids=app_ids)
+
+
+def get_membership(request, organization_pk):
+
+    # Resolves the current user's membership once per request, backed by the
+    # shared cache between requests
+
+    memberships = getattr(request, '_memberships', None)
+    if memberships is None:
+        memberships = request._memberships = {}
+    if organization_pk in memberships:
+        return memberships[organization_pk]
+
+    if not request.user.is_authenticated:
+        membership = Membership()
+    else:
+        key = f'home:permissions:{organization_pk}:{_permission_version(organization_pk)}:{request.user.pk}'
+        cached = cache.get(key)
+        if cached is not None:
+            membership = Membership(role=cached[0], app_ids=cached[1])
+        else:
+            membership = _load_membership(request.user, organization_pk)
+            cache.set(key, (membership.role, tuple(membership.app_ids)), PERMISSION_CACHE_TIMEOUT)
+
+    memberships[organization_pk] = membership
+    return membership
+
+
+def app_access_required(view):
+
+    # For views taking organization_pk and app_pk: lets through admins of the
+    # organization and members the app was shared with
+
+    @wraps(view)
+    def wrapper(request, organization_pk, app_pk, *args, **kwargs):
+        if not get_membership(request, organization_pk).can_access_app(app_pk):
+            return HttpResponse('You are not allowed here!', status=401)
+        return view(request, organization_pk, app_pk, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,106 @@
+from collections import namedtuple
+from .models import ListField, RecordField, RecordRow
+
+
+# Compact structures handed to records-list.html instead of model instances,
+# so the template never has to go back to the database while rendering
+GridRow = namedtuple('GridRow', ['record', 'primary_value', 'fields'])
+GridField = namedtuple('GridField', ['list_field', 'value', 'selected_record_id', 'selected_value'])
+
+
+def _load_from_record_fields(record_ids):
+    # (record_id -> [(list_field, value, selected_record_id)]) pivoted from RecordField
+    record_fields = RecordField.objects.filter(
+        record_id__in=record_ids,
+        status='active',
+        list_field__status='active') \
+        .select_related('list_field') \
+        .only('record_id', 'value', 'selected_record_id', 'list_field') \
+        .order_by('list_field__order')
+
+    fields_by_record = {}
+    for record_field in record_fields:
+        fields_by_record.setdefault(record_field.record_id, []).append(
+            (record_field.list_field, record_field.value, record_field.selected_record_id))
+    return fields_by_record
+
+
+def _load_from_record_rows(records):
+    # Same structure read from the materialized rows, one row per record plus
+    # the active list fields of their lists. Records that have no row yet are
+    # returned so the caller can fall back to RecordField for them.
+    record_rows = {row.record_id: row for row in RecordRow.objects.filter(record_id__in=[record.pk for record in records])}
+    list_fields = ListField.objects.filter(list_id__in=set(record.list_id for record in records), status='active').order_by('order')
+
+    fields_by_list = {}
+    for list_field in list_fields:
+        fields_by_list.setdefault(list_field.list_id, []).append(list_field)
+
+    fields_by_record = {}
+    missing_ids = []
+    for record in records:
+        row = record_rows.get(record.pk)
+        if row is None:
+            missing_ids.append(record.pk)
+            continue
+        fields_by_record[record.pk] = [
+            (list_field, row.values[list_field.field_id], row.selected_records.get(list_field.field_id))
+            for list_field in fields_by_list.get(record.list_id, [])
+            if list_field.field_id in row.values]
+    return fields_by_record, missing_ids
+
+
+def load_record_grid(records):
+
+    # Builds the rows for a page of records using a fixed number of queries
+    # (the records themselves, their fields, and the primary values of any
+    # records picked through choose-from-list fields), whatever the page size
+    # or the number of columns in the list. Fields are read from the
+    # materialized RecordRow for lists that keep one.
+
+    records = [record for record in records]
+    if not records:
+        return []
+
+    materialized = [record for record in records if record.list is not None and record.list.materialize_rows]
+    materialized_ids = set(record.pk for record in materialized)
+    fields_by_record = {}
+    fallback_ids = [record.pk for record in records if record.pk not in materialized_ids]
+    if materialized:
+        fields_by_record, missing_ids = _load_from_record_rows(materialized)
+        fallback_ids += missing_ids
+    if fallback_ids:
+        fields_by_record.update(_load_from_record_fields(fallback_ids))
+
+    selected_record_ids = set()
+    for fields in fields_by_record.values():
+        for list_field, value, selected_record_id in fields:
+            if list_field.field_type == 'choose-from-list' and selected_record_id:
+                selected_record_ids.add(selected_record_id)
+
+    # Only active records are linked from the grid, so archived targets are
+    # left out here and render without a badge
+    selected_values = {}
+    if selected_record_ids:
+        selected_values = dict(RecordField.objects.filter(
+            record_id__in=selected_record_ids,
+            record__status='active',
+            status='active',
+            list_field__primary=True,
+            list_field__status='active').values_list('record_id', 'value'))
+
+    rows = []
+    for record in records:
+        primary_value = None
+        fields = []
+        for list_field, value, selected_record_id in fields_by_record.get(record.pk, []):
+            if list_field.primary:
+                primary_value = value
+            fields.append(GridField(
+                list_field=list_field,
+                value=value,
+                selected_record_id=selected_record_id,
+                selected_value=selected_values.get(selected_record_id)))
+        rows.append(GridRow(record=record, primary_value=primary_value, fields=fields))
+
+    return rows
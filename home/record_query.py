@@ -0,0 +1,143 @@
+from django.db.models import Exists, F, OuterRef, Subquery
+from .models import ListField, RecordField
+
+
+FILTER_OPS = ['eq', 'gt', 'gte', 'lt', 'lte', 'between', 'empty', 'notempty', 'target']
+
+
+class RecordFilter:
+
+    def __init__(self, list_field, op, value=None):
+        self.list_field = list_field
+        self.op = op
+        self.value = value
+
+    @property
+    def column(self):
+        if self.op == 'target':
+            return 'selected_record_id'
+        if self.list_field.field_type in RecordField.NUMBER_FIELD_TYPES:
+            return 'value_number'
+        if self.list_field.field_type in RecordField.DATE_FIELD_TYPES:
+            return 'value_date'
+        return 'value_text'
+
+    def _typed(self, value):
+        # Reuses the same parsing as save_record so filter values compare
+        # against the typed columns exactly as stored
+        if self.op == 'target':
+            return value
+        record_field = RecordField(value=value)
+        record_field.set_typed_values(field_type=self.list_field.field_type)
+        return getattr(record_field, self.column)
+
+    def is_valid(self):
+        if self.op in ['empty', 'notempty']:
+            return True
+        if self.value is None:
+            return False
+        if self.op == 'between':
+            values = self.value.split('..', 1)
+            return len(values) == 2 and all(self._typed(value) is not None for value in values)
+        return self._typed(self.value) is not None
+
+    def matching_fields(self):
+        # RecordFields of this list field that satisfy the filter, served by
+        # the (list_field, typed value) indexes
+        record_fields = RecordField.objects.filter(list_field=self.list_field, status='active')
+        column = self.column
+        if self.op == 'between':
+            low, high = self.value.split('..', 1)
+            return record_fields.filter(**{f'{column}__gte': self._typed(low), f'{column}__lte': self._typed(high)})
+        if self.op in ['eq', 'target']:
+            return record_fields.filter(**{column: self._typed(self.value)})
+        if self.op in ['gt', 'gte', 'lt', 'lte']:
+            return record_fields.filter(**{f'{column}__{self.op}': self._typed(self.value)})
+        # empty / notempty
+        return record_fields.exclude(value__isnull=True).exclude(value='')
+
+    def apply(self, records):
+        if self.op == 'empty':
+            return records.filter(~Exists(self.matching_fields().filter(record=OuterRef('pk'))))
+        return records.filter(pk__in=self.matching_fields().values('record_id'))
+
+
+class RecordQuery:
+
+    # Sorting and filtering of a list's records by field value. The EAV
+    # layout (Record + RecordField) is compiled into SQL subqueries over the
+    # typed value columns, never filtered in Python.
+    #
+    # Query string format:
+    #   sort=<field_id>,-<field_id>,created_at
+    #   filter=<field_id>:<op>:<value>   (repeatable)
+    # where op is one of eq, gt, gte, lt, lte, between (value 'low..high'),
+    # empty, notempty, or target (a record id, for choose-from-list fields).
+
+    def __init__(self, list, sorts=None, filters=None):
+        self.list = list
+        self.sorts = sorts or []
+        self.filters = filters or []
+
+    @classmethod
+    def from_request(cls, list, params):
+        list_fields = {list_field.field_id: list_field for list_field in ListField.objects.filter(list=list, status='active')}
+
+        sorts = []
+        for key in params.get('sort', '').split(','):
+            key = key.strip()
+            descending = key.startswith('-')
+            key = key.lstrip('-')
+            if key == 'created_at':
+                sorts.append(('created_at', descending))
+            elif key in list_fields:
+                sorts.append((list_fields[key], descending))
+
+        filters = []
+        for spec in params.getlist('filter'):
+            parts = spec.split(':', 2)
+            if len(parts) < 2 or parts[0] not in list_fields or parts[1] not in FILTER_OPS:
+                # Easy error handling for now, unknown filters are ignored
+                continue
+            record_filter = RecordFilter(list_fields[parts[0]], parts[1], parts[2] if len(parts) > 2 else None)
+            if record_filter.is_valid():
+                filters.append(record_filter)
+
+        return cls(list, sorts=sorts, filters=filters)
+
+    def apply(self, records):
+        # Every filter is a subquery of the same statement, so the database
+        # picks which one to start from with its own statistics
+        for record_filter in self.filters:
+            records = record_filter.apply(records)
+
+        if self.sorts:
+            order = []
+            for index, (sort, descending) in enumerate(self.sorts):
+                if sort == 'created_at':
+                    order.append(F('created_at').desc() if descending else F('created_at').asc())
+                    continue
+                name = f'sort_{index}'
+                column = RecordFilter(sort, 'eq').column
+                records = records.annotate(**{name: Subquery(
+                    RecordField.objects.filter(record=OuterRef('pk'), list_field=sort, status='active').values(column)[:1])})
+                order.append(F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True))
+            if not any(sort == 'created_at' for sort, descending in self.sorts):
+                order.append(F('created_at').asc())
+            records = records.order_by(*order, 'id')
+
+        return records
+
+    def ordering(self):
+        # The sort applied by apply() in KeysetPaginator terms: the ordering
+        # and which of its columns may be NULL (records without a value)
+        ordering = []
+        nullable = []
+        for index, (sort, descending) in enumerate(self.sorts):
+            name = 'created_at' if sort == 'created_at' else f'sort_{index}'
+            ordering.append(f'-{name}' if descending else name)
+            if sort != 'created_at':
+                nullable.append(name)
+        if 'created_at' not in [name.lstrip('-') for name in ordering]:
+            ordering.append('created_at')
+        return ordering + ['id'], nullable
@@ -0,0 +1,93 @@
+from django.db import connection, transaction
+from django.db.models import F, Func, TextField, Value
+from django.utils import timezone
+from .models import RecordField, RecordRow
+
+
+def refresh_record_rows(records):
+
+    # Rebuilds the materialized rows of a batch of records in a fixed number
+    # of queries. Records of lists that don't materialize rows, and records
+    # that are no longer active, lose their row.
+
+    records = [record for record in records]
+    keep = [record for record in records if record.status == 'active' and record.list.materialize_rows]
+    keep_ids = set(record.pk for record in keep)
+    drop_ids = [record.pk for record in records if record.pk not in keep_ids]
+    if drop_ids:
+        RecordRow.objects.filter(record_id__in=drop_ids).delete()
+    if not keep:
+        return
+
+    record_ids = [record.pk for record in keep]
+    record_fields = RecordField.objects.filter(record_id__in=record_ids, status='active', list_field__status='active') \
+        .values_list('record_id', 'list_field__field_id', 'list_field__primary', 'value', 'selected_record_id')
+
+    rows = {}
+    for record in keep:
+        rows[record.pk] = RecordRow(record_id=record.pk, list_id=record.list_id, values={}, selected_records={})
+    for record_id, field_id, primary, value, selected_record_id in record_fields:
+        row = rows[record_id]
+        row.values[field_id] = value
+        if selected_record_id:
+            row.selected_records[field_id] = selected_record_id
+        if primary:
+            row.primary_value = value
+
+    existing_ids = set(RecordRow.objects.filter(record_id__in=record_ids).values_list('record_id', flat=True))
+    now = timezone.now()
+    new_rows = []
+    changed_rows = []
+    for record_id, row in rows.items():
+        row.last_updated = now
+        if record_id in existing_ids:
+            changed_rows.append(row)
+        else:
+            new_rows.append(row)
+
+    with transaction.atomic():
+        RecordRow.objects.bulk_create(new_rows)
+        RecordRow.objects.bulk_update(changed_rows, ['list_id', 'primary_value', 'values', 'selected_records', 'last_updated'])
+
+
+def remove_record_rows(records):
+    RecordRow.objects.filter(record__in=records).delete()
+
+
+def remove_field_from_rows(list_field):
+
+    # Drops a deleted field from every row of its list. Postgres removes the
+    # key in place with the jsonb '-' operator; elsewhere the rows are rebuilt.
+
+    if not list_field.list_id or not list_field.list.materialize_rows:
+        return
+
+    if connection.vendor == 'postgresql':
+        RecordRow.objects.filter(list_id=list_field.list_id).update(
+            values=Func(F('values'), Value(list_field.field_id, output_field=TextField()), template='%(expressions)s', arg_joiner=' - '),
+            selected_records=Func(F('selected_records'), Value(list_field.field_id, output_field=TextField()), template='%(expressions)s', arg_joiner=' - '))
+    else:
+        rebuild_list_rows(list_field.list)
+
+
+def rebuild_list_rows(list, batch_size=1000, start_after='', progress=None):
+
+    # Walks the records of a list by primary key and refreshes their rows in
+    # batches. Also used by the rebuild_record_rows command for drift repair.
+
+    records = list.record_set.select_related('list').order_by('pk')
+    last_pk = start_after
+    total = 0
+    while True:
+        batch = [record for record in records.filter(pk__gt=last_pk)[:batch_size]]
+        if not batch:
+            break
+        refresh_record_rows(batch)
+        total += len(batch)
+        last_pk = batch[-1].pk
+        if progress is not None:
+            progress(total, last_pk)
+
+    if not list.materialize_rows:
+        RecordRow.objects.filter(list=list).delete()
+    return total
@@ -0,0 +1,139 @@
+from django.core.cache import cache
+from django.db import connection
+from .models import Record, RecordRelation
+from .fragments import bump_list, bump_record, get_versions
+
+
+# The record graph: a RecordRelation is an edge from the record holding the
+# choose-from-list field (parent) to the chosen record (child). Neighbors of
+# many records are fetched in one query, and multi-hop walks run in the
+# database as a recursive CTE instead of one query per hop.
+
+# 'in' follows links pointing at a record (who links here), 'out' the links a
+# record holds, 'both' ignores the direction
+DIRECTIONS = ['in', 'out', 'both']
+
+MAX_DEPTH = 3
+MAX_RESULTS = 500
+TRAVERSAL_CACHE_TIMEOUT = 60 * 60
+
+
+def neighbors(record_ids, direction='in', list_field_ids=None):
+
+    # Returns {record_id: [neighbor ids]} for every record in record_ids in
+    # one query, optionally only over links made by some list fields
+
+    record_ids = [record_id for record_id in record_ids]
+    result = {record_id: [] for record_id in record_ids}
+    if not record_ids:
+        return result
+
+    relations = RecordRelation.objects.filter(status='active', parent_record__isnull=False, child_record__isnull=False)
+    if list_field_ids is not None:
+        relations = relations.filter(list_field_id__in=list_field_ids)
+
+    pairs = []
+    if direction in ['in', 'both']:
+        pairs += [(child, parent) for parent, child in relations.filter(child_record_id__in=record_ids).values_list('parent_record_id', 'child_record_id')]
+    if direction in ['out', 'both']:
+        pairs += [pair for pair in relations.filter(parent_record_id__in=record_ids).values_list('parent_record_id', 'child_record_id')]
+
+    for record_id, neighbor_id in pairs:
+        if neighbor_id not in result[record_id]:
+            result[record_id].append(neighbor_id)
+    return result
+
+
+def linked_records(record, direction='in'):
+    # The active records one link away, ready for load_record_grid
+    record_ids = neighbors([record.pk], direction)[record.pk]
+    return Record.objects.filter(pk__in=record_ids, status='active') \
+        .select_related('list', 'created_user').order_by('created_at', 'id')
+
+
+def bump_referrers(*record_ids):
+    # Records showing these records in a choose-from-list cell (with their
+    # primary value, or a link while they are active) and the lists showing
+    # those records, for when these records are edited or archived
+    referrers = RecordRelation.objects.filter(child_record_id__in=record_ids, status='active', parent_record__isnull=False) \
+        .values_list('parent_record_id', 'parent_record__list_id')
+    parents = set()
+    lists = set()
+    for parent_record_id, list_id in referrers:
+        parents.add(parent_record_id)
+        lists.add(list_id)
+    bump_record(*parents)
+    bump_list(*lists)
+
+
+def _walk_sql(direction):
+    relation_table = RecordRelation._meta.db_table
+    record_table = Record._meta.db_table
+    if direction == 'in':
+        join = 'relation.child_record_id = walk.record_id'
+        step = 'relation.parent_record_id'
+    elif direction == 'out':
+        join = 'relation.parent_record_id = walk.record_id'
+        step = 'relation.child_record_id'
+    else:
+        join = '(relation.parent_record_id = walk.record_id OR relation.child_record_id = walk.record_id)'
+        step = 'CASE WHEN relation.parent_record_id = walk.record_id THEN relation.child_record_id ELSE relation.parent_record_id END'
+
+    # Archived records are neither returned nor walked through. UNION (not
+    # UNION ALL) drops rows already reached at the same depth, so cycles cost
+    # at most one extra row per record and hop. Ids are cast to text as
+    # Postgres wants the same type on both sides of the recursion.
+    return f'''
+        WITH RECURSIVE walk(record_id, depth) AS (
+            SELECT CAST(%s AS text), 0
+            UNION
+            SELECT CAST({step} AS text), walk.depth + 1
+            FROM walk
+            JOIN {relation_table} relation ON {join} AND relation.status = 'active'
+            JOIN {record_table} record ON record.id = {step} AND record.status = 'active'
+            WHERE walk.depth < %s
+        )
+        SELECT walk.record_id, MIN(walk.depth)
+        FROM walk
+        WHERE walk.record_id <> %s
+        GROUP BY walk.record_id
+        ORDER BY MIN(walk.depth), walk.record_id
+        LIMIT %s
+    '''
+
+
+def _traverse(record_id, depth, direction, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(_walk_sql(direction), [record_id, depth, record_id, limit])
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def traverse(record_id, depth=2, direction='in', limit=MAX_RESULTS):
+
+    # Returns [(record_id, distance)] for the active records at most depth
+    # links away, nearest first. Results are cached with the version stamps
+    # of the start record and of every record reached: a link change bumps
+    # both of its records, so a cached walk is only reused while none of the
+    # records it went through has changed.
+
+    if direction not in DIRECTIONS:
+        raise ValueError(f'Unknown direction {direction}')
+    depth = max(1, min(int(depth), MAX_DEPTH))
+    limit = max(1, min(int(limit), MAX_RESULTS))
+
+    key = f'home:traverse:{record_id}:{direction}:{depth}:{limit}'
+    cached = cache.get(key)
+    if cached is not None:
+        stamps, result = cached
+        record_ids = [record_id] + [reached_id for reached_id, distance in result]
+        if stamps == get_versions([('record', pk) for pk in record_ids]):
+            return result
+
+    start_stamp = get_versions([('record', record_id)])[0]
+    result = _traverse(record_id, depth, direction, limit)
+    record_ids = [record_id] + [reached_id for reached_id, distance in result]
+    stamps = get_versions([('record', pk) for pk in record_ids])
+    # Not cached if the start record changed while walking
+    if stamps[0] == start_stamp:
+        cache.set(key, (stamps, result), TRAVERSAL_CACHE_TIMEOUT)
+    return result
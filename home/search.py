@@ -0,0 +1,99 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.utils import timezone
+from .models import Record, RecordField, RecordSearchDocument
+
+
+# 'simple' keeps the index language agnostic, list values are free form
+SEARCH_CONFIG = 'simple'
+
+
+def _use_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def refresh_search_documents(records):
+
+    # Rebuilds the search documents of a batch of records from their active
+    # fields in a fixed number of queries. The primary value leads the
+    # document and is also indexed on its own with the higher weight.
+
+    records = [record for record in records]
+    active_records = [record for record in records if record.status == 'active']
+    inactive_ids = [record.pk for record in records if record.status != 'active']
+    if inactive_ids:
+        RecordSearchDocument.objects.filter(record_id__in=inactive_ids).delete()
+    if not active_records:
+        return
+
+    record_ids = [record.pk for record in active_records]
+    values = RecordField.objects.filter(record_id__in=record_ids, status='active', list_field__status='active') \
+        .order_by('list_field__order') \
+        .values_list('record_id', 'list_field__primary', 'value')
+
+    primary_values = {}
+    other_values = {}
+    for record_id, primary, value in values:
+        if not value:
+            continue
+        if primary:
+            primary_values[record_id] = value
+        else:
+            other_values.setdefault(record_id, []).append(value)
+
+    existing_ids = set(RecordSearchDocument.objects.filter(record_id__in=record_ids).values_list('record_id', flat=True))
+    now = timezone.now()
+    new_documents = []
+    changed_documents = []
+    for record in active_records:
+        primary_value = primary_values.get(record.pk, '')
+        search_document = RecordSearchDocument(
+            record_id=record.pk,
+            list_id=record.list_id,
+            primary_value=primary_value,
+            primary_search=primary_value.lower(),
+            document=' '.join([primary_value] + other_values.get(record.pk, [])).strip().lower(),
+            last_updated=now)
+        if record.pk in existing_ids:
+            changed_documents.append(search_document)
+        else:
+            new_documents.append(search_document)
+
+    with transaction.atomic():
+        RecordSearchDocument.objects.bulk_create(new_documents)
+        RecordSearchDocument.objects.bulk_update(changed_documents, ['list_id', 'primary_value', 'primary_search', 'document', 'last_updated'])
+
+        if _use_postgres_search():
+            RecordSearchDocument.objects.filter(record_id__in=record_ids).update(
+                search_vector=SearchVector('primary_value', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('document', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_document(record):
+    refresh_search_documents([record])
+
+
+def remove_search_document(record):
+    RecordSearchDocument.objects.filter(record=record).delete()
+
+
+def search_records(list, search):
+
+    # Returns the active records of a list matching the search terms, best
+    # matches first. Whole words are matched through the full text index and
+    # partial words through the trigram index on the lowercased document, so
+    # results still include everything the old substring search found.
+
+    records = Record.objects.filter(list=list, status='active')
+    contains = Q(search_document__document__contains=search.strip().lower())
+
+    if _use_postgres_search():
+        query = SearchQuery(search, config=SEARCH_CONFIG)
+        return records.filter(Q(search_document__search_vector=query) | contains) \
+            .annotate(rank=SearchRank(F('search_document__search_vector'), query)) \
+            .order_by('-rank', 'created_at', 'id')
+
+    return records.filter(contains) \
+        .annotate(rank=Value(0, output_field=FloatField())) \
+        .order_by('created_at', 'id')
@@ -0,0 +1,53 @@
+from django.apps import apps as global_apps
+from django.db.models import OuterRef, Subquery
+
+
+# Tenant keys: List, Record, RecordField and RecordRelation carry copies of
+# their app and organization so scoped queries (TenantManager) filter on the
+# row itself. The write paths set them; rows written before the keys existed
+# are filled here, one table at a time and in batches of short UPDATEs, so it
+# runs online next to live traffic. Migration 0014 runs a copy of it between
+# adding the columns and building their indexes, and the backfill_tenant_keys
+# command runs it again after the deploy for the rows old code wrote in the
+# meantime (ids are random, so those can land behind a batch already done).
+# Scoped reads only see rows with their keys filled: deploy with
+# TENANT_KEYS_FALLBACK = True, run the command, then turn the setting off.
+
+BACKFILL_BATCH_SIZE = 1000
+
+# (model, relation the keys come from, model of that relation, keys), in
+# the order each table's source is filled before it
+TENANT_TABLES = [
+    ('List', 'app', 'App', ['organization']),
+    ('Record', 'list', 'List', ['app', 'organization']),
+    ('RecordField', 'record', 'Record', ['app', 'organization']),
+    ('RecordRelation', 'parent_record', 'Record', ['app', 'organization']),
+]
+
+
+def backfill_tenant_keys(model_name, batch_size=BACKFILL_BATCH_SIZE, start_after='', apps=global_apps, progress=None):
+
+    # Fills the missing keys of one table from its source and returns the
+    # number of rows updated. Rows whose source has no keys (e.g. a record
+    # whose list is gone) stay empty. progress(model_name, filled, last_pk)
+    # is called after every batch; last_pk can be passed back as start_after.
+
+    model_name, via, source_name, keys = [table for table in TENANT_TABLES if table[0] == model_name][0]
+    model = apps.get_model('home', model_name)
+    source = apps.get_model('home', source_name)
+
+    values = {f'{key}_id': Subquery(source.objects.filter(pk=OuterRef(f'{via}_id')).values(f'{key}_id')[:1]) for key in keys}
+    # organization is always the last key set, so it marks the rows to do
+    rows = model.objects.filter(organization_id__isnull=True, **{f'{via}_id__isnull': False}).order_by('pk')
+
+    last_pk = start_after
+    filled = 0
+    while True:
+        pks = [pk for pk in rows.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size]]
+        if not pks:
+            break
+        filled += model.objects.filter(pk__in=pks).update(**values)
+        last_pk = pks[-1]
+        if progress is not None:
+            progress(model_name, filled, last_pk)
+    return filled
@@ -1,3 +1,148 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core import signing
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import App, List, ListField, Organization, OrganizationUser, Record, RecordField, TenantScopeError, randomstr
+from .pagination import KeysetPaginator
+from .record_query import RecordQuery
 
-# Create your tests here.
+
+def create_tenant(name, user=None):
+    organization = Organization.objects.create(id=randomstr(), name=name)
+    if user is not None:
+        OrganizationUser.objects.create(user=user, organization=organization, role='admin')
+    app = App.objects.create(id=randomstr(), name=name, organization=organization)
+    list = List.objects.create(id=randomstr(), name=name, app=app, organization=organization)
+    return organization, app, list
+
+
+def create_record(list, created_at=None, **keys):
+    keys.setdefault('app_id', list.app_id)
+    keys.setdefault('organization_id', list.organization_id)
+    record = Record.objects.create(id=randomstr(), list=list, status='active', **keys)
+    if created_at is not None:
+        # auto_now_add ignores the value given on create
+        Record.objects.filter(pk=record.pk).update(created_at=created_at)
+        record.created_at = created_at
+    return record
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        organization, app, cls.list = create_tenant('Keyset')
+        start = timezone.now()
+        # Pairs of records share a created_at so the id has to break the ties
+        cls.records = [create_record(cls.list, created_at=start + timedelta(minutes=index // 2)) for index in range(11)]
+        cls.records.sort(key=lambda record: (record.created_at, record.pk))
+
+    def paginator(self, **kwargs):
+        return KeysetPaginator(Record.objects.filter(list=self.list), 3, **kwargs)
+
+    def walk(self, paginator):
+        pages = []
+        page = paginator.get_page()
+        pages.append([record.pk for record in page])
+        while page.has_next():
+            page = paginator.get_page(page.next_token)
+            pages.append([record.pk for record in page])
+        return pages, page
+
+    def test_pages_cover_every_record_once_in_order(self):
+        pages, last_page = self.walk(self.paginator())
+        self.assertEqual([pk for page in pages for pk in page], [record.pk for record in self.records])
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertFalse(last_page.has_next())
+
+    def test_previous_tokens_walk_back_the_same_pages(self):
+        paginator = self.paginator()
+        pages, page = self.walk(paginator)
+        back = [[record.pk for record in page]]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_token)
+            back.append([record.pk for record in page])
+        self.assertEqual(back[::-1], pages)
+
+    def test_descending_ordering(self):
+        pages, last_page = self.walk(self.paginator(ordering=('-created_at', '-id')))
+        self.assertEqual([pk for page in pages for pk in page], [record.pk for record in reversed(self.records)])
+
+    def test_tampered_token_gives_the_first_page(self):
+        paginator = self.paginator()
+        first = [record.pk for record in paginator.get_page()]
+        token = paginator.get_page().next_token
+        forged = signing.dumps(['next', 'created_at,id', ['2000-01-01 00:00:00+00:00', '']], salt='another')
+        for bad_token in [token[:-2] + 'xx', forged, 'garbage']:
+            self.assertEqual([record.pk for record in paginator.get_page(bad_token)], first)
+
+    def test_token_only_fits_its_ordering(self):
+        token = self.paginator().get_page().next_token
+        other = self.paginator(ordering=('-created_at', '-id'))
+        self.assertEqual([record.pk for record in other.get_page(token)], [record.pk for record in other.get_page()])
+
+    def test_nullable_sort_keeps_records_without_a_value_last(self):
+        list_field = ListField(list=self.list, field_label='Amount', field_type='number', order=0)
+        list_field.save()
+        list_field.save()
+        for index, record in enumerate(self.records[:7]):
+            record_field = RecordField(id=randomstr(), record=record, list_field=list_field, value=str(index % 3), status='active')
+            record_field.set_typed_values(field_type='number')
+            record_field.save()
+
+        for sort in [list_field.field_id, f'-{list_field.field_id}']:
+            query = RecordQuery.from_request(self.list, QueryDict(f'sort={sort}'))
+            records = query.apply(Record.objects.filter(list=self.list))
+            ordering, nullable = query.ordering()
+            pages, last_page = self.walk(KeysetPaginator(records, 3, ordering=ordering, nullable=nullable))
+            walked = [pk for page in pages for pk in page]
+            self.assertEqual(walked, [record.pk for record in records])
+            self.assertEqual(set(walked[-4:]), set(record.pk for record in self.records[7:]))
+
+
+class TenantManagerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@example.com', 'password')
+        cls.organization, cls.app, cls.list = create_tenant('Mine', cls.user)
+        cls.other_organization, cls.other_app, cls.other_list = create_tenant('Theirs')
+        cls.record = create_record(cls.list)
+        cls.other_record = create_record(cls.other_list)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_unscoped_queries_are_refused(self):
+        with self.assertRaises(TenantScopeError):
+            Record.scoped.all()
+        with self.assertRaises(TenantScopeError):
+            Record.scoped.filter(pk=self.record.pk)
+        with self.assertRaises(TenantScopeError):
+            List.scoped.get(pk=self.list.pk)
+
+    def test_scoped_queries_only_see_the_tenant(self):
+        records = Record.scoped.for_tenant(self.organization.pk, self.app.pk)
+        self.assertEqual([record.pk for record in records], [self.record.pk])
+        self.assertFalse(Record.scoped.for_organization(self.organization.pk).filter(pk=self.other_record.pk).exists())
+        self.assertFalse(Record.scoped.for_tenant(self.organization.pk, self.other_app.pk).exists())
+        self.assertFalse(List.scoped.for_tenant(self.other_organization.pk, self.app.pk).exists())
+
+    def test_rows_without_keys_need_the_fallback(self):
+        record = create_record(self.list, app_id=None, organization_id=None)
+        self.assertFalse(Record.scoped.for_tenant(self.organization.pk, self.app.pk).filter(pk=record.pk).exists())
+        with override_settings(TENANT_KEYS_FALLBACK=True):
+            self.assertTrue(Record.scoped.for_tenant(self.organization.pk, self.app.pk).filter(pk=record.pk).exists())
+            self.assertFalse(Record.scoped.for_tenant(self.other_organization.pk, self.app.pk).filter(pk=record.pk).exists())
+
+    def test_records_of_other_tenants_are_not_found(self):
+        # Through this user's own organization and app, and through the other one's
+        for organization_pk, app_pk in [(self.organization.pk, self.app.pk), (self.other_organization.pk, self.other_app.pk)]:
+            url = reverse('record_graph', args=[organization_pk, app_pk, self.other_list.pk, self.other_record.pk])
+            self.assertIn(self.client.get(url).status_code, [401, 404])
+
+        url = reverse('record_graph', args=[self.organization.pk, self.app.pk, self.list.pk, self.record.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
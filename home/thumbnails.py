@@ -0,0 +1,114 @@
+import hashlib
+import io
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from .models import RecordFile, Thumbnail
+
+
+# Pre-rendered thumbnails of record files. Derivatives are stored under the
+# SHA-256 of their source image, so identical uploads share them, and the
+# Thumbnail table indexes what exists so pages never decode an image.
+
+# name -> (width, height, padded to the exact size with a black mat)
+THUMBNAIL_VARIANTS = {
+    'grid': (320, 180, True),
+    'card': (700, 394, True),
+    'full': (1600, 1600, False),
+}
+
+# name -> (Pillow format, save options)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def source_hash(field_file):
+    sha256 = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for data in field_file.chunks():
+            sha256.update(data)
+    finally:
+        field_file.close()
+    return sha256.hexdigest()
+
+
+def thumbnail_name(content_hash, variant, format):
+    return f'thumbnails/{content_hash[:2]}/{content_hash}/{variant}.{format}'
+
+
+def render_thumbnails(field_file):
+
+    # Decodes the source once and yields (variant, format, bytes, width, height)
+    # for every variant
+
+    from PIL import Image, ImageOps
+
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    finally:
+        field_file.close()
+
+    for variant, (width, height, padded) in THUMBNAIL_VARIANTS.items():
+        if padded:
+            resized = ImageOps.pad(image, (width, height), color=(0, 0, 0))
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height))
+        for format, (pillow_format, options) in THUMBNAIL_FORMATS.items():
+            output = io.BytesIO()
+            resized.save(output, pillow_format, **options)
+            yield variant, format, output.getvalue(), resized.width, resized.height
+
+
+def generate_thumbnails(record_file, force=False):
+
+    # Makes sure every variant exists for the file's thumbnail source and
+    # points the file at them. Only renders when the content hash has not
+    # been seen before (or force is set).
+
+    if not record_file.thumbnail_source_image:
+        return None
+
+    if record_file.blob_id and record_file.thumbnail_source_image.name == record_file.file.name:
+        # Images are their own thumbnail source, the blob key is that hash
+        content_hash = record_file.blob_id
+    else:
+        content_hash = source_hash(record_file.thumbnail_source_image)
+    expected = len(THUMBNAIL_VARIANTS) * len(THUMBNAIL_FORMATS)
+    if force or Thumbnail.objects.filter(source_hash=content_hash).count() < expected:
+        thumbnails = []
+        for variant, format, data, width, height in render_thumbnails(record_file.thumbnail_source_image):
+            name = thumbnail_name(content_hash, variant, format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(data))
+            thumbnails.append(Thumbnail(source_hash=content_hash, variant=variant, format=format, file=name, width=width, height=height))
+        Thumbnail.objects.filter(source_hash=content_hash).delete()
+        Thumbnail.objects.bulk_create(thumbnails, ignore_conflicts=True)
+
+    RecordFile.objects.filter(pk=record_file.pk).update(thumbnail_hash=content_hash)
+    record_file.thumbnail_hash = content_hash
+    return content_hash
+
+
+def attach_thumbnails(record_files):
+
+    # Sets file.thumbnails = {variant: {format: url}} on each file with one
+    # query for the whole page, so templates can build <picture> tags
+
+    record_files = [record_file for record_file in record_files]
+    hashes = set(record_file.thumbnail_hash for record_file in record_files if record_file.thumbnail_hash)
+
+    by_hash = {}
+    if hashes:
+        for thumbnail in Thumbnail.objects.filter(source_hash__in=hashes):
+            by_hash.setdefault(thumbnail.source_hash, {}).setdefault(thumbnail.variant, {})[thumbnail.format] = thumbnail.file.url
+
+    for record_file in record_files:
+        record_file.thumbnails = by_hash.get(record_file.thumbnail_hash, {})
+    return record_files
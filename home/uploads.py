@@ -0,0 +1,228 @@
+import hashlib
+import io
+import os
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import FileUpload, RecordFile, randomstr
+from .blobs import add_reference, create_blob
+
+
+# Resumable chunked uploads. Every chunk is streamed to the storage backend
+# as its own object under uploads/<upload_pk>/ and the final blob is written
+# by reading those objects back in order, so neither a request nor the
+# assembly ever holds more than a buffer of the file in memory.
+
+# Suggested to clients; S3 multipart uploads need parts of at least 5 MB
+CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+MIME_SNIFF_BYTES = 8 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadConflict(UploadError):
+    # The chunk does not start where the upload currently ends, the client
+    # should resume from upload.received_size
+    pass
+
+
+def _checksum(uploaded_file):
+    sha256 = hashlib.sha256()
+    for data in uploaded_file.chunks():
+        sha256.update(data)
+    return sha256.hexdigest()
+
+
+def _sniff_type(uploaded_file):
+    from magic import from_buffer
+    uploaded_file.seek(0)
+    mime = from_buffer(uploaded_file.read(MIME_SNIFF_BYTES), mime=True)
+    uploaded_file.seek(0)
+
+    if mime in RecordFile.image_types:
+        return RecordFile.IMAGE
+    elif mime in RecordFile.video_types:
+        return RecordFile.VIDEO
+    return RecordFile.FILE
+
+
+def start_upload(record, user, file_name, total_size):
+    file_name = os.path.basename(file_name or '')
+    if not file_name:
+        raise UploadError('A file name is required')
+    if total_size < 0:
+        raise UploadError('Invalid file size')
+    return FileUpload.objects.create(
+        id=randomstr(),
+        record=record,
+        created_user=user,
+        file_name=file_name,
+        total_size=total_size)
+
+
+def append_chunk(upload, offset, uploaded_file, checksum=None):
+
+    # Stores one chunk. offset must be the number of bytes received so far;
+    # sending a chunk again after a dropped response is answered with an
+    # UploadConflict carrying the offset to resume from.
+
+    if upload.status != 'uploading':
+        raise UploadError('This upload is already %s' % upload.status)
+    if uploaded_file.size == 0 or uploaded_file.size > MAX_CHUNK_SIZE:
+        raise UploadError('Chunks must be between 1 byte and %d bytes' % MAX_CHUNK_SIZE)
+    if offset != upload.received_size:
+        raise UploadConflict('Expected offset %d' % upload.received_size)
+    if offset + uploaded_file.size > upload.total_size:
+        raise UploadError('Chunk goes past the announced file size')
+    if checksum and checksum.lower() != _checksum(uploaded_file):
+        raise UploadError('Chunk checksum mismatch')
+
+    file_type = _sniff_type(uploaded_file) if offset == 0 else None
+    chunk_name = default_storage.save('uploads/%s/%015d' % (upload.pk, offset), uploaded_file)
+
+    with transaction.atomic():
+        current = FileUpload.objects.select_for_update().get(pk=upload.pk)
+        if current.status != 'uploading' or current.received_size != offset:
+            # Another request stored this part first
+            default_storage.delete(chunk_name)
+            raise UploadConflict('Expected offset %d' % current.received_size)
+        current.chunks.append([chunk_name, uploaded_file.size])
+        current.received_size = offset + uploaded_file.size
+        if file_type is not None:
+            current.file_type = file_type
+        current.save(update_fields=['chunks', 'received_size', 'file_type', 'last_updated'])
+    return current
+
+
+class ChunkReader(io.RawIOBase):
+
+    # Read-only stream over the stored chunks of an upload, in order, hashing
+    # the bytes as they go by
+
+    def __init__(self, chunk_names):
+        self.chunk_names = chunk_names
+        self.current = None
+        self.position = 0
+        self.sha256 = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Storage backends rewind before writing, which is fine before the
+        # first read
+        if whence == io.SEEK_SET and offset == self.position:
+            return self.position
+        raise io.UnsupportedOperation('ChunkReader can only be read forward')
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                if not self.chunk_names:
+                    return 0
+                self.current = default_storage.open(self.chunk_names.pop(0), 'rb')
+            data = self.current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.sha256.update(data)
+                self.position += len(data)
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
+
+
+def _delete_chunks(upload):
+    for chunk_name, size in upload.chunks:
+        default_storage.delete(chunk_name)
+
+
+def _chunk_content(upload):
+    reader = ChunkReader([chunk_name for chunk_name, size in upload.chunks])
+    content = File(reader, name=upload.file_name)
+    content.size = upload.total_size
+    return reader, content
+
+
+def _lock_pending(upload):
+    # Completing and aborting lock the upload row, so a concurrent or retried
+    # request waits for the first one and then finds it no longer uploading
+    upload = FileUpload.objects.select_for_update().get(pk=upload.pk)
+    if upload.status != 'uploading':
+        raise UploadError('This upload is already %s' % upload.status)
+    return upload
+
+
+def complete_upload(upload, checksum=None):
+
+    # Turns the chunks into a RecordFile backed by a blob and removes them.
+    # The chunks are always hashed here first: content is only shared with
+    # an existing blob once its bytes were received and hashed, never on the
+    # client's word. A checksum sent by the client is compared against that
+    # hash. Returns the saved RecordFile, media processing is left to the
+    # caller.
+
+    with transaction.atomic():
+        upload = _lock_pending(upload)
+        if upload.received_size != upload.total_size:
+            raise UploadError('Received %d of %d bytes' % (upload.received_size, upload.total_size))
+
+        reader, content = _chunk_content(upload)
+        with reader:
+            for data in content.chunks():
+                pass
+        content_hash = reader.sha256.hexdigest()
+        if checksum and checksum.lower() != content_hash:
+            raise UploadError('File checksum mismatch')
+
+        blob = add_reference(content_hash)
+        if blob is None:
+            reader, content = _chunk_content(upload)
+            with reader:
+                blob = create_blob(content_hash, content, os.path.splitext(upload.file_name)[1])
+
+        splited_name = upload.file_name.split('.')
+        record_file = RecordFile(
+            id=randomstr(),
+            record_id=upload.record_id,
+            created_user=upload.created_user,
+            type=upload.file_type,
+            blob=blob,
+            file=blob.file.name,
+            name_of_file=splited_name[0],
+            file_extension='.' + splited_name[-1])
+        record_file.save()
+
+        upload.status = 'complete'
+        upload.checksum = blob.sha256
+        upload.record_file = record_file
+        upload.save(update_fields=['status', 'checksum', 'record_file', 'last_updated'])
+
+    _delete_chunks(upload)
+    return record_file
+
+
+def abort_upload(upload):
+    with transaction.atomic():
+        upload = _lock_pending(upload)
+        chunks = upload.chunks
+        upload.status = 'aborted'
+        upload.chunks = []
+        upload.save(update_fields=['status', 'chunks', 'last_updated'])
+    for chunk_name, size in chunks:
+        default_storage.delete(chunk_name)
+    return upload
@@ -10,6 +10,7 @@ urlpatterns = [
     path('organizations/', views.organizations, name='organizations'),
     path('organizations/add/', views.add_organization, name='add_organization'),
     path('organizations/<organization_pk>/settings/', views.organization_settings, name='organization_settings'),
+    path('organizations/<organization_pk>/members/bulk/', views.bulk_members, name='bulk_members'),
     path('organizations/<organization_pk>/edit/', views.edit_organization, name='edit_organization'),
     path('organizations/<organization_pk>/archive/', views.archive_organization, name='archive_organization'),
     path('organizations/<organization_pk>/apps/', views.apps, name='apps'),
@@ -24,20 +25,29 @@ urlpatterns = [
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/edit/', views.edit_list, name='edit_list'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/settings/', views.list_settings, name='list_settings'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/archive/', views.archive_list, name='archive_list'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/import/', views.import_records, name='import_records'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/export/', views.export_list, name='export_list'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/options/', views.list_options, name='list_options'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/add-record/', views.add_record, name='add_record'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/save-record/', views.save_record, name='save_record'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/', views.record, name='record'), # Forward without details to details
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/', views.record_details, name='record_details'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/post_comment/', views.post_record_comment, name='post_record_comments'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/post_file/', views.post_record_file, name='post_record_file'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/uploads/', views.start_file_upload, name='start_file_upload'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/uploads/<upload_pk>/', views.file_upload, name='file_upload'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/uploads/<upload_pk>/complete/', views.complete_file_upload, name='complete_file_upload'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/delete_comment/<record_comment_pk>/', views.delete_record_comment, name='delete_record_comment'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/edit_comment/<record_comment_pk>/', views.edit_record_comment, name='edit_record_comment'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/delete_file/<record_file_pk>/', views.delete_record_file, name='delete_record_file'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/edit_file/<record_file_pk>/', views.edit_record_file, name='edit_record_file'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/details/download_file/<record_file_pk>/', views.download_record_file, name='download_record_file'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/links/', views.record_links, name='record_links'),
+    path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/graph/', views.record_graph, name='record_graph'),
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/records/<record_pk>/edit/', views.edit_record, name='edit_record'),
 
     path('organizations/<organization_pk>/apps/<app_pk>/activity/', views.activity, name='activity'),
+    path('organizations/<organization_pk>/apps/<app_pk>/activity/feed/', views.activity_feed, name='activity_feed'),
 
 
     path('organizations/<organization_pk>/apps/<app_pk>/lists/<list_pk>/record/<record_pk>/', views.archive_record, name='archive_record'),
@@ -0,0 +1,136 @@
+import io
+import os
+import cv2 as cv
+import numpy as np
+from django.core.files.base import ContentFile
+
+
+# Video thumbnails and previews. analyze_video only deals with a local path
+# and plain values, so it can run in any process; process_video stores its
+# results on a RecordFile.
+
+# Frames read at evenly spaced positions, this bounds the decoding work
+# whatever the length of the video
+CANDIDATE_FRAMES = 12
+# Width the candidates are scored at, enough to tell a black frame from a scene
+SCORE_WIDTH = 160
+# Frames darker or brighter than this on average (0-255) are fades / blank
+MIN_BRIGHTNESS = 24
+MAX_BRIGHTNESS = 232
+
+PREVIEW_FRAMES = 8
+PREVIEW_WIDTH = 320
+PREVIEW_FRAME_MS = 400
+
+
+def _resize(frame, width):
+    height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+    return cv.resize(frame, (width, height), interpolation=cv.INTER_AREA)
+
+
+def frame_score(frame):
+
+    # Higher is more representative: the spread of the luminance, with
+    # frames that are almost black or white ranked below every usable one
+
+    small = _resize(frame, SCORE_WIDTH).astype(np.float32)
+    luminance = small @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    brightness = luminance.mean()
+    if brightness < MIN_BRIGHTNESS or brightness > MAX_BRIGHTNESS:
+        return float(brightness / 255.0) - 1.0
+    return float(luminance.std())
+
+
+def _sample_frames(capture, frame_count):
+    if frame_count > 0:
+        positions = np.unique(np.linspace(frame_count * 0.05, frame_count * 0.95, CANDIDATE_FRAMES).astype(int))
+        frames = []
+        for position in positions:
+            capture.set(cv.CAP_PROP_POS_FRAMES, int(position))
+            success, frame = capture.read()
+            if success:
+                frames.append(frame)
+        if frames:
+            return frames
+
+    # Streams that can't report their length or seek: keep the first frames
+    capture.set(cv.CAP_PROP_POS_FRAMES, 0)
+    frames = []
+    for _ in range(CANDIDATE_FRAMES):
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    return frames
+
+
+def _frame_at(capture, millisecond):
+    capture.set(cv.CAP_PROP_POS_MSEC, millisecond)
+    success, frame = capture.read()
+    return frame if success else None
+
+
+def _preview_strip(frames):
+    # Animated WebP cycling through frames spread over the video
+    from PIL import Image
+
+    picks = np.linspace(0, len(frames) - 1, min(PREVIEW_FRAMES, len(frames))).astype(int)
+    images = [Image.fromarray(cv.cvtColor(_resize(frames[index], PREVIEW_WIDTH), cv.COLOR_BGR2RGB)) for index in picks]
+    output = io.BytesIO()
+    images[0].save(output, 'WEBP', save_all=True, append_images=images[1:], duration=PREVIEW_FRAME_MS, loop=0, quality=70)
+    return output.getvalue()
+
+
+def analyze_video(path, thumbnail_millisecond=0):
+
+    # Returns the duration / resolution of the video, the chosen thumbnail
+    # frame as JPEG bytes and the preview strip as WebP bytes. A non zero
+    # thumbnail_millisecond picks that exact frame instead.
+
+    capture = cv.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError('The video could not be opened')
+
+        fps = capture.get(cv.CAP_PROP_FPS)
+        frame_count = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+        width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+
+        frames = _sample_frames(capture, frame_count)
+        chosen = _frame_at(capture, thumbnail_millisecond) if thumbnail_millisecond else None
+    finally:
+        capture.release()
+
+    if not frames:
+        raise ValueError('No frame could be decoded')
+    if chosen is None:
+        scores = np.array([frame_score(frame) for frame in frames])
+        chosen = frames[int(scores.argmax())]
+
+    success, thumbnail = cv.imencode('.jpg', chosen, [cv.IMWRITE_JPEG_QUALITY, 90])
+    return {
+        'duration': frame_count / fps if fps > 0 and frame_count > 0 else None,
+        'width': width or chosen.shape[1],
+        'height': height or chosen.shape[0],
+        'thumbnail': thumbnail.tobytes(),
+        'preview': _preview_strip(frames),
+    }
+
+
+def process_video(record_file):
+
+    # Fills the thumbnail source, preview strip and metadata of a video
+    # RecordFile (saving is left to the caller)
+
+    from .media import local_copy
+
+    with local_copy(record_file.file) as path:
+        result = analyze_video(path, int(record_file.thumbnail_millisecond))
+
+    base_name = record_file.blob_id or os.path.splitext(record_file.filename())[0]
+    record_file.thumbnail_source_image.save(base_name + '_thumbnail_src_image.jpg', ContentFile(result['thumbnail']), save=False)
+    record_file.preview_strip.save(base_name + '_preview.webp', ContentFile(result['preview']), save=False)
+    record_file.duration = result['duration']
+    record_file.width = result['width']
+    record_file.height = result['height']
@@ -2,17 +2,37 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.template import loader
 from django.http import JsonResponse
 from django.template.loader import render_to_string
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 import json
 from django.core import serializers
+import os
 import uuid
 import random
 import string
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from .models import *
 from .forms import OrganizationForm, AppForm, ListForm, ListFieldFormset
+from .record_grid import load_record_grid
+from .search import search_records, update_search_document, remove_search_document
+from .importer import RecordImporter, RecordImportError, open_import_file
+from .exporter import EXPORT_FORMATS
+from .pagination import KeysetPaginator
+from .record_query import RecordQuery
+from .record_rows import refresh_record_rows, remove_record_rows, remove_field_from_rows
+from .permissions import app_access_required, get_membership
+from .counters import adjust_record_count, refresh_member_counts
+from .jobs import enqueue
+from .media import process_record_file
+from .thumbnails import attach_thumbnails
+from .blobs import download_response, store_file
+from .fragments import cached_fragment, bump_app, bump_list, bump_record
+from .options import list_options as load_list_options
+from .relations import DIRECTIONS as RELATION_DIRECTIONS, bump_referrers, linked_records, traverse
+from .events import ACTIVITY_PAGE_SIZE, activity_page, event_data, log_event
+from .memberships import add_members, remove_members
+from .uploads import CHUNK_SIZE as UPLOAD_CHUNK_SIZE, UploadError, UploadConflict, start_upload, append_chunk, complete_upload, abort_upload
 from django.views.decorators.csrf import csrf_exempt
 import subprocess
 from itertools import chain
@@ -20,6 +40,7 @@ from tempfile import NamedTemporaryFile
 from subprocess import call
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.db import transaction
 
 N = 16
 def randomstr():
@@ -58,7 +79,7 @@ def about(request):
 @login_required
 def organizations(request):
 
-    userOrganizations = OrganizationUser.objects.filter(user=request.user, status__exact='active', organization__status__exact="active").order_by('organization__name',)
+    userOrganizations = OrganizationUser.objects.filter(user=request.user, status__exact='active', organization__status__exact="active").order_by('organization__name',).select_related('organization')
     organizations = []
 
     for userOrganization in userOrganizations:
@@ -90,6 +111,7 @@ def add_organization(request):
             org_user.role = "admin"
             org_user.save()
             organization.save()
+            refresh_member_counts([organization.pk])
             return redirect('apps', organization_pk=organization.pk)
 
     else:
@@ -150,32 +172,15 @@ def organization_settings(request, organization_pk):
             return HttpResponse('You are not allowed here!', status=401)
     #    print(request.POST)
         if request.POST['type'] == "add_user":
-            try:
-                u = User.objects.get(email=request.POST['email'])
-                organization.active_users.add(u)
-                org_user = OrganizationUser.objects.get(user=u,organization=organization)
-                org_user.status='active'
-                org_user.save()
-                organization.save()
-            except:
-                u = InactiveUsers.objects.get_or_create(user_email=request.POST['email'])
-                u[0].save()
-                organization.inactive_users.add(u[0])
-                organization.save()
+            # Existing accounts become members, other emails are invited
+            add_members(organization, [(request.POST['email'], None)], actor=request.user)
 
             return JsonResponse({
                 "added" : "true"
             })
 
         elif request.POST['type'] == "remove_user":
-            if request.POST['user_type'] == "active":
-                org_user = OrganizationUser.objects.get(user__email=request.POST['email'],organization_id=organization.pk)
-                org_user.status = "deleted"
-                org_user.save()
-            else:
-                u = InactiveUsers.objects.get(user_email=request.POST['email'])
-                organization.inactive_users.remove(u)
-                organization.save()
+            remove_members(organization, [request.POST['email']], actor=request.user)
             return JsonResponse({
                 "removed" : "true"
             })
@@ -185,6 +190,7 @@ def organization_settings(request, organization_pk):
             print(org_user)
             org_user.role = request.POST['to']
             org_user.save()
+            log_event(Event.MEMBER_ROLE_CHANGED, organization.pk, user=request.user, data={'email': request.POST['email'], 'role': org_user.role})
 
             return JsonResponse({
                 "changed_to" : org_user.role
@@ -208,6 +214,42 @@ def organization_settings(request, organization_pk):
 
 
 
+@login_required
+def bulk_members(request, organization_pk):
+
+    # Adds or removes many people at once, for admins. Takes a JSON body:
+    #   {"action": "add" | "remove", "apps": [app ids],
+    #    "members": [{"email": "...", "role": "admin" | "user"}, ...]}
+    # apps is optional; roles are optional and only used when adding. Returns
+    # one result per email (see home/memberships.py).
+
+    organization = get_object_or_404(Organization, pk=organization_pk)
+    if request.method != "POST":
+        return HttpResponse('method not allowed', status=405)
+    if not OrganizationUser.objects.filter(organization=organization, user=request.user, role='admin', status='active').exists():
+        return HttpResponse('You are not allowed here!', status=401)
+
+    try:
+        body = json.loads(request.body)
+        action = body.get('action', 'add')
+        members = [(member.get('email'), member.get('role')) for member in body.get('members', [])]
+        app_ids = [str(app_id) for app_id in body.get('apps', [])]
+    except (ValueError, AttributeError, TypeError):
+        return JsonResponse({'error': 'Invalid request body'}, status=400)
+    if action not in ['add', 'remove']:
+        return JsonResponse({'error': 'Unknown action'}, status=400)
+
+    apps = [app for app in App.objects.filter(pk__in=app_ids, organization=organization)]
+    if len(apps) != len(set(app_ids)):
+        return JsonResponse({'error': 'Unknown app'}, status=400)
+
+    if action == 'add':
+        report = add_members(organization, members, apps, actor=request.user)
+    else:
+        report = remove_members(organization, [email for email, role in members], apps, actor=request.user)
+    return JsonResponse({'results': report})
+
+
 #===============================================================================
 # Apps (Workspaces)
 #===============================================================================
@@ -263,6 +305,7 @@ def add_app(request, organization_pk):
             app.created_at = timezone.now()
             app.id = randomstr()
             app.save()
+            refresh_member_counts([organization.pk])
 
             # Save the new user <> project relation
             appUser = AppUser()
@@ -285,23 +328,19 @@ def add_app(request, organization_pk):
         return render(request, 'home/app-form.html', {'form': form})
 
 @login_required
+@app_access_required
 def edit_app(request, organization_pk, app_pk):
 
     # Uses standard django forms
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
     if request.method == "POST":
         form = AppForm(request.POST, instance=app)
         if form.is_valid():
             app = form.save(commit=False)
             app.save()
+            bump_app(app.pk)
             return redirect('apps', organization_pk=organization_pk)
     else:
         form = AppForm(instance=app)
@@ -315,16 +354,11 @@ def edit_app(request, organization_pk, app_pk):
         return render(request, 'home/app-form.html', {'form': form})
 
 @login_required
+@app_access_required
 def archive_app(request, organization_pk, app_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
     app.status = "archived"
     app.save()
 
@@ -332,55 +366,22 @@ def archive_app(request, organization_pk, app_pk):
 
 @login_required
 @csrf_exempt
+@app_access_required
 def app_settings(request, organization_pk, app_pk):
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
     # Uses standard django forms
     if request.method == "POST":
         print(request.POST)
         #print(request.POST)
         if request.POST['type'] == "add_user":
-            print('if')
-            try:
-                u = User.objects.get(email=request.POST['email'])
-                print(u)
-                organization.active_users.add(u)
-                organization.save()
-                org_user = OrganizationUser.objects.get(organization=organization,user=u)
-                org_user.permitted_apps.add(app)
-                org_user.status='active'
-                org_user.save()
-                #print(org_user.permitted_apps.objects.all())
-                app.save()
-            except:
-
-                u = InactiveUsers.objects.get_or_create(user_email=request.POST['email'])
-                u[0].attached_workspaces.add(app)
-                organization.inactive_users.add(u[0])
-
-                u[0].save()
-                organization.save()
+            add_members(organization, [(request.POST['email'], None)], [app], actor=request.user)
             return JsonResponse({
                 "added" : "true"
             })
 
         elif request.POST['type'] == "remove_user":
-            print('elif')
-            if request.POST['user_type'] == "active":
-                org_user = OrganizationUser.objects.get(user__email=request.POST['email'],organization_id=organization.pk)
-                print(org_user)
-                org_user.permitted_apps.remove(app)
-                org_user.save()
-            else:
-                u = InactiveUsers.objects.get(user_email=request.POST['email'])
-                u.attached_workspaces.remove(app)
-                u.save()
+            remove_members(organization, [request.POST['email']], [app], actor=request.user)
 
             return JsonResponse({
                 "removed" : "true"
@@ -391,6 +392,7 @@ def app_settings(request, organization_pk, app_pk):
             print(org_user)
             org_user.role = request.POST['to']
             org_user.save()
+            log_event(Event.MEMBER_ROLE_CHANGED, organization.pk, app.pk, user=request.user, data={'email': request.POST['email'], 'role': org_user.role})
 
             return JsonResponse({
                 "changed_to" : org_user.role
@@ -416,16 +418,11 @@ def app_settings(request, organization_pk, app_pk):
     return render(request, 'home/app-settings.html', context=context)
 
 @login_required
+@app_access_required
 def app_details(request, organization_pk, app_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
     context = {
         'organization': organization,
         'app': app,
@@ -440,16 +437,12 @@ def app_details(request, organization_pk, app_pk):
 #===============================================================================
 
 @login_required
+@app_access_required
 def activity(request, organization_pk, app_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
+    events = activity_page(app.pk, request.GET.get('cursor', None))
     if request.is_ajax() and request.method == "GET":
 
         # Call is ajax, just load main content needed here
@@ -458,7 +451,8 @@ def activity(request, organization_pk, app_pk):
             template_name="home/activity.html",
             context={
                 'organization': organization,
-                'app': app
+                'app': app,
+                'events': events
             }
         )
 
@@ -471,26 +465,37 @@ def activity(request, organization_pk, app_pk):
         context = {
             'organization': organization,
             'app': app,
+            'events': events,
             'type': 'activity'
         }
 
         return render(request, 'home/workspace.html', context=context)
 
+@login_required
+@app_access_required
+def activity_feed(request, organization_pk, app_pk):
+
+    # The app's event log as JSON, newest first: ?cursor= continues from the
+    # previous page's next token, ?record= narrows it to one record
+
+    try:
+        per_page = int(request.GET.get('per_page', None) or ACTIVITY_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid per_page'}, status=400)
+    events = activity_page(app_pk, request.GET.get('cursor', None), per_page, request.GET.get('record', None))
+    return JsonResponse({'events': [event_data(event) for event in events], 'next': events.next_token})
+
 
 #===============================================================================
 # Lists
 #===============================================================================
 
 @login_required
+@app_access_required
+@cached_fragment('app')
 def lists(request, organization_pk, app_pk):
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    org_obj = OrganizationUser.objects.filter(organization=organization,user=request.user, status__exact='active')
-    if not org_obj.exists():
-        return HttpResponse('You are not allowed here!', status=401)
-    elif app not in org_obj[0].permitted_apps.all():
-        if org_obj[0].role != 'admin':
-            return HttpResponse('You are not allowed here!', status=401)
 
 
     # lists = List.objects.all().filter(status='active', app=app)
@@ -526,40 +531,47 @@ def lists(request, organization_pk, app_pk):
 
 @csrf_exempt
 @login_required
+@cached_fragment('app', 'list')
 def list(request, organization_pk, app_pk, list_pk):
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
-    search = request.GET.get('search', None)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+    # Ajax calls may pass the search terms as search_value instead
+    search = request.GET.get('search', None) or request.GET.get('search_value', None)
 
-    if search != None:
-        fields = RecordField.objects.filter(value__icontains=search, record__list=list)
-        list_of_records=fields.values_list('record_id',flat=True)
-        records=Record.objects.filter(pk__in=list_of_records)
+    if search:
+        records = search_records(list, search).select_related('list', 'created_user')
     else:
-        records = Record.objects.filter(status='active', list=list)
-
-    per_page = request.GET.get('per_page', None)
-    search = request.GET.get('search', None)
+        records = Record.objects.filter(status='active', list=list).select_related('list', 'created_user').order_by('created_at', 'id')
 
-    if per_page != None:
-        paginator = Paginator(records,per_page)
-    else:
-        paginator = Paginator(records, 10)
+    # Sorting and filtering by field value, see home/record_query.py
+    record_query = RecordQuery.from_request(list, request.GET)
+    records = record_query.apply(records)
 
+    per_page = request.GET.get('per_page', None) or 10
     page_number = request.GET.get('page', None)
-    records_page = paginator.get_page(1)
-    if page_number != '':
-        records_page = paginator.get_page(page_number)
+
+    # List views page with a cursor (keyset) so deep pages cost the same as
+    # the first one, sorted or not: sorted views seek on the sort values,
+    # then created_at and id. Ranked search results and old ?page= links
+    # still use the numbered Paginator.
+    cursor_pagination = not search and not page_number
+
+    if cursor_pagination:
+        ordering, nullable = record_query.ordering()
+        paginator = KeysetPaginator(records, per_page, ordering=ordering, nullable=nullable)
+        records_page = paginator.get_page(request.GET.get('cursor', None), with_count=request.GET.get('count', None) is not None)
     else:
-        records_page = paginator.get_page(1)
+        paginator = Paginator(records, per_page)
+        records_page = paginator.get_page(page_number or 1)
+
+    # Only the cursor pages count, and only when asked to (?count)
+    record_count = records_page.count if cursor_pagination else None
+
+    # Load every field needed by records-list.html up front
+    rows = load_record_grid(records_page.object_list)
 
     if request.is_ajax() and request.method == "GET":
-        search_value = request.GET.get('search_value')
-        if search_value:
-            record_fields = RecordField.objects.filter(record__list=list, value__icontains=search_value)
-            record_ids = [i['record_id'] for i in record_fields.values('record_id')]
-            records = Record.objects.filter(id__in=record_ids, status='active', list=list)
         # Call is ajax, just load main content needed here
         #paginator = Paginator(records, 10)
 
@@ -570,7 +582,10 @@ def list(request, organization_pk, app_pk, list_pk):
                 'organization': organization,
                 'app': app,
                 'list': list,
-                'records': records_page
+                'records': records_page,
+                'rows': rows,
+                'record_count': record_count,
+                'cursor_pagination': cursor_pagination
             }
         )
 
@@ -587,6 +602,9 @@ def list(request, organization_pk, app_pk, list_pk):
             'app': app,
             'list': list,
             'records': records_page,
+            'rows': rows,
+            'record_count': record_count,
+            'cursor_pagination': cursor_pagination,
             'type': 'list'
         }
 
@@ -619,6 +637,7 @@ def create_list(request, organization_pk, app_pk):
         if listform.is_valid() and formset.is_valid():
             list = listform.save(commit=False)
             list.app = app
+            list.organization_id = app.organization_id
             list.created_user = request.user
             list.created_at = timezone.now()
             list.id =randomstr()
@@ -665,6 +684,7 @@ def create_list(request, organization_pk, app_pk):
                 if change_from_select_list is False:
                     list_field_order += 1
 
+            bump_app(app_pk)
             return redirect('lists', organization_pk=organization_pk, app_pk=app_pk)
         else:
             print(formset.errors)
@@ -686,7 +706,7 @@ def edit_list(request, organization_pk, app_pk, list_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
     # Django formset stuff
 
     # Use model formset and not inline formset for more control over the data
@@ -737,7 +757,11 @@ def edit_list(request, organization_pk, app_pk, list_pk):
                     list_field_object = ListField.objects.get(id=int(list_field_id))
                     list_field_object.status = "deleted"
                     list_field_object.save()
+                    remove_field_from_rows(list_field_object)
                 except: pass
+
+            bump_app(app_pk)
+            bump_list(list.pk)
             return redirect('lists', organization_pk=organization_pk, app_pk=app_pk)
         else:
             print(f'List Form Error\t\t\t\t{listform.errors}\nField Type Error\t\t\t\t{formset.errors}')
@@ -760,10 +784,12 @@ def archive_list(request, organization_pk, app_pk, list_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
 
     list.status = "archived"
     list.save()
+    bump_app(app.pk)
+    bump_list(list.pk)
 
     # Able to use a redirect here because we did a direct POST request
     return redirect('lists', organization_pk=organization_pk, app_pk=app_pk)
@@ -776,7 +802,7 @@ def list_settings(request, organization_pk, app_pk, list_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
 
     context = {
         'organization': organization,
@@ -786,6 +812,57 @@ def list_settings(request, organization_pk, app_pk, list_pk):
 
     return render(request, 'home/list-settings.html', context=context)
 
+@login_required
+@app_access_required
+def import_records(request, organization_pk, app_pk, list_pk):
+
+    # Bulk loads an uploaded CSV / JSONL file into the list, see home/importer.py
+
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+
+    if request.method != "POST" or 'file' not in request.FILES:
+        return JsonResponse({"error": "POST a CSV or JSONL file as 'file'"}, status=400)
+
+    uploaded_file = request.FILES['file']
+    file_format = request.POST.get('format') or ('jsonl' if uploaded_file.name.lower().endswith(('.jsonl', '.json')) else 'csv')
+
+    importer = RecordImporter(list, user=request.user, batch_size=1000)
+    try:
+        result = importer.run(open_import_file(uploaded_file.file), file_format=file_format, start_row=int(request.POST.get('start_row', 0)))
+    except (RecordImportError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(result)
+
+@login_required
+@app_access_required
+def export_list(request, organization_pk, app_pk, list_pk):
+
+    # Streams every active record of the list, see home/exporter.py
+
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": "format must be one of " + ', '.join(EXPORT_FORMATS)}, status=400)
+
+    export, content_type = EXPORT_FORMATS[file_format]
+    response = StreamingHttpResponse(export(list), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{list.pk}.{file_format}"'
+    return response
+
+
+@login_required
+@app_access_required
+def list_options(request, organization_pk, app_pk, list_pk):
+
+    # Options for choose-from-list fields whose source is list_pk, one page
+    # at a time: ?search= filters on the start of the primary value and
+    # ?cursor= continues from a previous page's next token
+
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk, status='active')
+    options = load_list_options(list, request.GET.get('search', ''), request.GET.get('cursor', None))
+    return JsonResponse(options)
 
 #===============================================================================
 # Records
@@ -798,7 +875,7 @@ def add_record(request, organization_pk, app_pk, list_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
 
     fields = []
     for list_field in list.list_fields:
@@ -812,7 +889,8 @@ def add_record(request, organization_pk, app_pk, list_pk):
         field_object['order'] = list_field.order
         field_object['id'] = list_field.id
         if list_field.field_type == "choose-from-list":
-            field_object['select_record'] = RecordField.objects.filter(record__list=list_field.select_list.id, record__status="active", status="active", list_field__primary=True).values_list('record', 'value')
+            # Options are loaded by the form from list_options, page by page
+            field_object['select_list_id'] = list_field.select_list_id
         fields.append(field_object)
     fields.reverse()
 
@@ -855,147 +933,145 @@ def save_record(request, organization_pk, app_pk, list_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
 
     record_id = request.POST.get('record_id', None)
     fields = json.loads(request.POST['field_values'])
-    print(request.POST)
 
     # TODO
     # Needs error handling here verify if the form is valid (i.e. all required fields, acceptable data types, etc)
 
-    record = None # Create object globally outside of the if/else
+    # All reads and writes below run in one transaction with a fixed number of
+    # queries: the target list fields and the existing record fields / relations
+    # are each loaded once, and only rows whose values changed are written.
 
-    if record_id is not None:
-        # Get the existing record / this is a record being edited
-        record = get_object_or_404(Record, pk=record_id)
-    else:
-        # Add a new record
-        record = Record.objects.create(
-            list=list,
-            status='active',
-            created_at=timezone.now(),
-            created_user=request.user,
-            id=randomstr())
-        record.save()
-    for field in fields:
-            # if field['fieldValue']:
-            # if field['fieldValue'] is not None:
-                # Only save a RecordField object if there is a value
-
-                if record_id is not None:
-                    try:
-                        # Update existing record field
-                        # TODO only update if the value changed
-                        record_field = RecordField.objects.get(status='active', list_field__field_id=field['fieldId'], record=record)
-                        if field['fieldType'] == "choose-from-list":
-                           record_field.selected_record_id = field['fieldValue']
-                           record_field.value = field['selectListValue']
-                        #    record_field.id = randomstr()
-                        else:
-                            record_field.value = field['fieldValue']
-                            # record_field.id = randomstr()
-                        record_field.save()
-
-                        # Update existing relationship
-                        if field['fieldType'] == "choose-from-list":
-                            try:
-                                record_relation = RecordRelation.objects.get(status='active', list_field__field_id=field['fieldId'], parent_record=record)
-                                record_relation.child_record_id = field['fieldValue']
-                                record_relation.save()
-                            except RecordRelation.DoesNotExist:
-                                # Create the record relation / does not exist
-                                record_relation = RecordRelation.objects.create(
-                                    parent_record=record,
-                                    child_record_id=record_field.selected_record_id,
-                                    relation_type='choose-from-list',
-                                    list_field=record_field.list_field,
-                                    status='active',
-                                    created_at=timezone.now(),
-                                    created_user=request.user,
-                                    id=randomstr()
-                                    )
-                                record_relation.save()
-
-                    except RecordField.DoesNotExist:
-                        # This record field has not been saved before, so create it
-                        # TODO this is redundant with below / can be consolidated eventually
-                        try:
-
-                            list_field = ListField.objects.get(status='active', field_id=field['fieldId'], list=list)
-
-                            # Create the new record field
-                            record_field = RecordField.objects.create(
-                                record=record,
-                                list_field=list_field,
-                                status='active',
-                                created_at=timezone.now(),
-                                created_user=request.user)
-                            record_field.save()
-
-                            if field['fieldType'] == "choose-from-list":
-                                record_field.selected_record_id = field['fieldValue']
-                                record_field.value = field['selectListValue']
-                            else:
-                                record_field.value = field['fieldValue']
-                            record_field.save()
-
-                            # Create the record relation if select from list
-                            if field['fieldType'] == "choose-from-list":
-                                record_relation = RecordRelation.objects.create(
-                                    parent_record=record,
-                                    child_record_id=record_field.selected_record_id,
-                                    relation_type='choose-from-list',
-                                    list_field=record_field.list_field,
-                                    status='active',
-                                    created_at=timezone.now(),
-                                    created_user=request.user,
-                                    id=randomstr())
-                                record_relation.save()
-
-                        except ListField.DoesNotExist:
-                            # Easy error handling for now
-                            pass
+    now = timezone.now()
+    changed = False
 
-                else:
-                    try:
-
-                        # Create new record field
-
-                        list_field = ListField.objects.get(status='active', field_id=field['fieldId'], list=list)
-
-                        record_field = RecordField.objects.create(
-                            record=record,
-                            list_field=list_field,
-                            status='active',
-                            created_at=timezone.now(),
-                            created_user=request.user,
-                            id=randomstr())
-                        record_field.save()
-
-                        if field['fieldType'] == "choose-from-list":
-                            record_field.selected_record_id = field['fieldValue']
-                            record_field.value = field['selectListValue']
-                        else:
-                            record_field.value = field['fieldValue']
-                        record_field.save()
-
-                        # Create the record relation if select from list
-                        if field['fieldType'] == "choose-from-list":
-                            record_relation = RecordRelation.objects.create(
-                                parent_record=record,
-                                child_record_id=record_field.selected_record_id,
-                                relation_type='choose-from-list',
-                                list_field=record_field.list_field,
-                                status='active',
-                                created_at=timezone.now(),
-                                created_user=request.user,
-                                id=randomstr())
-                            record_relation.save()
+    with transaction.atomic():
 
-                    except ListField.DoesNotExist:
-                        # Easy error handling for now
-                        pass
+        if record_id is not None:
+            # Get the existing record / this is a record being edited
+            record = get_object_or_404(Record.scoped.for_tenant(organization.pk, app.pk), pk=record_id, list=list)
+        else:
+            # Add a new record
+            record = Record.objects.create(
+                list=list,
+                app_id=app.pk,
+                organization_id=organization.pk,
+                status='active',
+                created_at=now,
+                created_user=request.user,
+                id=randomstr())
+            adjust_record_count(list.pk, 1)
+            changed = True
+
+        list_fields = {}
+        for list_field in ListField.objects.filter(status='active', list=list, field_id__in=[field['fieldId'] for field in fields]):
+            list_fields[list_field.field_id] = list_field
+
+        record_fields = {}
+        record_relations = {}
+        if record_id is not None:
+            for record_field in RecordField.objects.filter(status='active', record=record, list_field__in=list_fields.values()):
+                record_fields[record_field.list_field_id] = record_field
+            for record_relation in RecordRelation.objects.filter(status='active', parent_record=record, list_field__in=list_fields.values()):
+                record_relations[record_relation.list_field_id] = record_relation
+
+        new_record_fields = []
+        updated_record_fields = []
+        new_record_relations = []
+        updated_record_relations = []
+        # field_id -> [old value, new value] for the activity log
+        changes = {}
+
+        for field in fields:
+            list_field = list_fields.get(field['fieldId'])
+            if list_field is None:
+                # Easy error handling for now
+                continue
+
+            if field['fieldType'] == "choose-from-list":
+                value = field['selectListValue']
+                selected_record_id = field['fieldValue'] or None
+            else:
+                value = field['fieldValue']
+                selected_record_id = None
+
+            record_field = record_fields.get(list_field.id)
+            if record_field is None:
+                # This record field has not been saved before, so create it
+                record_field = RecordField(
+                    id=randomstr(),
+                    record=record,
+                    app_id=app.pk,
+                    organization_id=organization.pk,
+                    list_field=list_field,
+                    value=value,
+                    selected_record_id=selected_record_id,
+                    status='active',
+                    created_at=now,
+                    created_user=request.user,
+                    last_updated=now)
+                record_field.set_typed_values(field_type=list_field.field_type)
+                new_record_fields.append(record_field)
+                changes[list_field.field_id] = [None, value]
+            elif record_field.value != value or record_field.selected_record_id != selected_record_id:
+                # Update existing record field, only if the value changed
+                changes[list_field.field_id] = [record_field.value, value]
+                record_field.value = value
+                record_field.selected_record_id = selected_record_id
+                record_field.last_updated = now
+                record_field.set_typed_values(field_type=list_field.field_type)
+                updated_record_fields.append(record_field)
+
+            if field['fieldType'] == "choose-from-list":
+                record_relation = record_relations.get(list_field.id)
+                if record_relation is None:
+                    # Create the record relation / does not exist
+                    new_record_relations.append(RecordRelation(
+                        parent_record=record,
+                        app_id=app.pk,
+                        organization_id=organization.pk,
+                        child_record_id=selected_record_id,
+                        relation_type='choose-from-list',
+                        list_field=list_field,
+                        status='active',
+                        created_at=now,
+                        created_user=request.user,
+                        last_updated=now,
+                        id=randomstr()))
+                elif record_relation.child_record_id != selected_record_id:
+                    # Update existing relationship
+                    record_relation.child_record_id = selected_record_id
+                    record_relation.last_updated = now
+                    updated_record_relations.append(record_relation)
+
+        # Records linked before or after the change list this one on their links page
+        linked_record_ids = set(relation.child_record_id for relation in record_relations.values())
+        linked_record_ids.update(relation.child_record_id for relation in new_record_relations + updated_record_relations)
+
+        RecordField.objects.bulk_create(new_record_fields)
+        RecordField.objects.bulk_update(updated_record_fields, ['value', 'selected_record', 'value_number', 'value_date', 'value_text', 'last_updated'])
+        RecordRelation.objects.bulk_create(new_record_relations)
+        RecordRelation.objects.bulk_update(updated_record_relations, ['child_record', 'last_updated'])
+
+        if changed or new_record_fields or updated_record_fields:
+            update_search_document(record)
+            if list.materialize_rows:
+                refresh_record_rows([record])
+
+    if changed or new_record_fields or updated_record_fields or new_record_relations or updated_record_relations:
+        if changed:
+            # Record counts on the lists page
+            bump_app(app_pk)
+        bump_list(list.pk)
+        bump_record(record.pk, *linked_record_ids)
+        if not changed:
+            # Cells elsewhere showing this record's primary value
+            bump_referrers(record.pk)
+        log_event(Event.RECORD_CREATED if changed else Event.RECORD_UPDATED, organization.pk, app.pk, list.pk, record.pk,
+                  user=request.user, data={'fields': changes})
 
     # Redirect based on ajax call from frontend on success
 
@@ -1005,15 +1081,16 @@ def save_record(request, organization_pk, app_pk, list_pk):
 
 
 @login_required
+@cached_fragment('app', 'list', 'record')
 def record(request, organization_pk, app_pk, list_pk, record_pk):
 
     # Record details page (placeholder for now)
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
-    record = get_object_or_404(Record, pk=record_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
     comments = RecordComment.objects.filter(record_id=record_pk).order_by('-pk')
-    files = RecordFile.objects.filter(record_id=record_pk).order_by('-pk')
+    files = attach_thumbnails(RecordFile.objects.filter(record_id=record_pk).order_by('-pk'))
     # media = RecordMedia.objects.filter(record_id=record_pk).order_by('-pk')
 
 
@@ -1058,17 +1135,18 @@ def record(request, organization_pk, app_pk, list_pk, record_pk):
         return render(request, 'home/workspace.html', context=context)
 
 @login_required
+@cached_fragment('app', 'list', 'record')
 def record_details(request, organization_pk, app_pk, list_pk, record_pk):
 
     # Record details page (placeholder for now)
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
-    record = get_object_or_404(Record, pk=record_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
     comments = RecordComment.objects.filter(record_id=record_pk).order_by('-created_at')
     # media = RecordMedia.objects.filter(record_id=record_pk).order_by('-pk')
-    files = RecordFile.objects.filter(record_id=record_pk).order_by('-pk')
+    files = attach_thumbnails(RecordFile.objects.filter(record_id=record_pk).order_by('-pk'))
 
 
     if request.is_ajax() and request.method == "GET":
@@ -1122,18 +1200,17 @@ def record_details(request, organization_pk, app_pk, list_pk, record_pk):
 #=========================================================================================
 
 @login_required
+@cached_fragment('app', 'record')
 def record_links(request, organization_pk, app_pk, list_pk, record_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
 
     # Record details page (placeholder for now)
-    record = get_object_or_404(Record, pk=record_pk)
-    record_relations = RecordRelation.objects.all().filter(status='active', child_record=record, parent_record__status='active')
-    records = []
-    for relation in record_relations:
-        records.append(relation.parent_record)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
+    records = [linked for linked in linked_records(record, 'in')]
+    rows = load_record_grid(records)
 
     if request.is_ajax() and request.method == "GET":
 
@@ -1146,7 +1223,8 @@ def record_links(request, organization_pk, app_pk, list_pk, record_pk):
                 'app': app,
                 'list': list,
                 'record': record,
-                'records': records
+                'records': records,
+                'rows': rows
 
             }
         )
@@ -1165,19 +1243,56 @@ def record_links(request, organization_pk, app_pk, list_pk, record_pk):
             'list': list,
             'record': record,
             'records': records,
+            'rows': rows,
             'type': 'record',
             'record_view': 'record-links'
         }
 
         return render(request, 'home/workspace.html', context=context)
 
+@login_required
+@app_access_required
+def record_graph(request, organization_pk, app_pk, list_pk, record_pk):
+
+    # Records up to ?depth= links away (see home/relations.py), nearest first,
+    # e.g. ?depth=2&direction=both for everything two links away in any direction
+
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
+    direction = request.GET.get('direction', 'in')
+    if direction not in RELATION_DIRECTIONS:
+        return JsonResponse({'error': 'Unknown direction'}, status=400)
+    try:
+        depth = int(request.GET.get('depth', 1))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid depth'}, status=400)
+
+    reached = traverse(record.pk, depth, direction)
+    reached_ids = [record_id for record_id, distance in reached]
+
+    # Links can lead into other apps: only records of apps this user can open
+    # are returned, with their primary value if they have one
+    membership = get_membership(request, organization_pk)
+    found = {record_id: list_id for record_id, list_id, app_id
+             in Record.scoped.for_organization(organization_pk).filter(pk__in=reached_ids).values_list('id', 'list_id', 'app_id')
+             if membership.can_access_app(app_id)}
+    primary_values = dict(RecordField.objects.filter(
+        record_id__in=found.keys(),
+        status='active',
+        list_field__primary=True).values_list('record_id', 'value'))
+
+    records = []
+    for record_id, distance in reached:
+        if record_id in found:
+            records.append({'id': record_id, 'list': found[record_id], 'value': primary_values.get(record_id), 'depth': distance})
+    return JsonResponse({'record': record.pk, 'direction': direction, 'records': records})
+
 @login_required
 def edit_record(request, organization_pk, app_pk, list_pk, record_pk):
 
     organization = get_object_or_404(Organization, pk=organization_pk)
     app = get_object_or_404(App, pk=app_pk)
-    list = get_object_or_404(List, pk=list_pk)
-    record = get_object_or_404(Record, pk=record_pk)
+    list = get_object_or_404(List.scoped.for_tenant(organization_pk, app_pk), pk=list_pk)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
 
     # Very similar to the add_record view, but includes the field values previously saved
     # Probably a way to combine these views to consolidate
@@ -1204,9 +1319,13 @@ def edit_record(request, organization_pk, app_pk, list_pk, record_pk):
         field_object['order'] = list_field.order
         # Get the field value if it exists
         if list_field.field_type == "choose-from-list":
-            field_object['select_record'] = RecordField.objects.filter(record__list=list_field.select_list.id, record__status="active", status="active", list_field__primary=True).values_list('record', 'value')
+            # Only the current choice is rendered, the others are loaded by
+            # the form from list_options
+            field_object['select_list_id'] = list_field.select_list_id
             try:
-                field_object['value'] = RecordField.objects.get(record_id=record_pk, list_field_id=list_field.id, status="active").value
+                record_field = RecordField.objects.get(record_id=record_pk, list_field_id=list_field.id, status="active")
+                field_object['value'] = record_field.value
+                field_object['selected_record_id'] = record_field.selected_record_id
             except:
                 pass
         else:
@@ -1254,9 +1373,20 @@ def edit_record(request, organization_pk, app_pk, list_pk, record_pk):
 # TODO need view for archiving records
 def archive_record(request, organization_pk, app_pk, list_pk, record_pk):
     #   this functional is call when user click on the "Archive Record" button on Record Detail Page
-    record = get_object_or_404(Record, pk=record_pk)
-    record.status = "archived"
-    record.save()
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk)
+    with transaction.atomic():
+        # Only the request that actually flips the status moves the counter
+        archived = Record.objects.filter(pk=record.pk, status='active').update(status='archived')
+        record.status = "archived"
+        adjust_record_count(record.list_id, -archived)
+    remove_search_document(record)
+    bump_app(app_pk)
+    bump_list(record.list_id)
+    bump_record(record.pk, *RecordRelation.objects.filter(parent_record=record, status='active').values_list('child_record_id', flat=True))
+    bump_referrers(record.pk)
+    remove_record_rows([record])
+    if archived:
+        log_event(Event.RECORD_ARCHIVED, organization_pk, app_pk, record.list_id, record.pk, user=request.user)
     return redirect('list', organization_pk=organization_pk, app_pk=app_pk, list_pk=list_pk)
 
 #===============================================================================
@@ -1281,6 +1411,9 @@ def post_record_comment(request,organization_pk, app_pk, list_pk, record_pk):
             record_comment = RecordComment(created_user=request.user,content = request.POST['content'],record_id=record_pk)
             record_comment.id = randomstr()
             record_comment.save()
+            bump_record(record_pk)
+            log_event(Event.COMMENT_ADDED, organization_pk, app_pk, list_pk, record_pk, user=request.user,
+                      data={'comment': record_comment.pk})
             final = {}
             final['delete_url'] = record_comment.delete_url()
             final['id'] = record_comment.pk
@@ -1294,29 +1427,131 @@ def post_record_comment(request,organization_pk, app_pk, list_pk, record_pk):
 
 
 @csrf_exempt
+@login_required
+@app_access_required
 def post_record_file(request,organization_pk, app_pk, list_pk, record_pk):
-    record_file = RecordFile(file=request.FILES['file'],record_id=record_pk,created_user = request.user)
+    # The file is only stored here, type detection and thumbnails are done by
+    # the job worker (see home/media.py) so the upload returns right away
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk, list_id=list_pk)
+    uploaded_file = request.FILES['file']
+    file_name = os.path.basename(uploaded_file.name)
+    blob = store_file(uploaded_file, os.path.splitext(file_name)[1])
+    record_file = RecordFile(file=blob.file.name,blob=blob,record=record,created_user = request.user)
     record_file.id =randomstr()
-    record_file.save()
-    record_File = RecordFile.objects.get(pk=record_file.pk)
-    final = {}
-    splited_name = record_file.filename().split('.')
+    splited_name = file_name.split('.')
     record_file.name_of_file = splited_name[0]
     record_file.file_extension ='.'+splited_name[-1]
     record_file.save()
-    record_File = RecordFile.objects.get(pk=record_file.pk)
-    final['file_name'] = splited_name[0]
-    final['file_extension'] = '.'+splited_name[-1]
+    bump_record(record_pk)
+    log_event(Event.FILE_ADDED, organization_pk, app_pk, list_pk, record_pk, user=request.user,
+              data={'file': record_file.pk, 'name': file_name})
+    enqueue(process_record_file, record_file_pk=record_file.pk)
+    final =json.dumps(record_file_data(RecordFile.objects.get(pk=record_file.pk)))
+    return JsonResponse(data=final, safe=False)
+
+
+def record_file_data(record_File):
+    # What the record details page needs to render a newly added file
+    final = {}
+    final['file_name'] = record_File.name_of_file
+    final['file_extension'] = record_File.file_extension
     final['file_url'] = record_File.url()
-    if str(record_File.image_thumbnail) != '':
-        final['thumbnail'] = record_File.image_thumbnail.url
+    thumbnails = attach_thumbnails([record_File])[0].thumbnails
+    if record_File.has_preview and 'card' in thumbnails:
+        final['thumbnail'] = thumbnails['card']['jpeg']
     else:
         final['thumbnail'] = None
     final['delete_url'] = record_File.delete_url()
     final['edit_url']=record_File.edit_url()
-    final['id']=record_file.pk
-    final['type'] = record_file.type
-    final =json.dumps(final)
+    final['download_url'] = record_File.download_url()
+    final['id']=record_File.pk
+    final['type'] = record_File.type
+    final['status'] = record_File.processing_status
+    if record_File.type == RecordFile.VIDEO:
+        final['preview'] = record_File.preview_strip.url if record_File.preview_strip else None
+        final['duration'] = record_File.duration
+        final['width'] = record_File.width
+        final['height'] = record_File.height
+    return final
+
+
+#===============================================================================
+# Chunked uploads
+#===============================================================================
+
+# Resumable uploads for large files (see home/uploads.py):
+#   POST .../uploads/                     file_name, size -> upload id
+#   GET  .../uploads/<upload_pk>/         current offset, to resume
+#   POST .../uploads/<upload_pk>/         offset, file, optional sha256 checksum
+#   POST .../uploads/<upload_pk>/complete/  optional sha256 checksum of the file
+#   DELETE .../uploads/<upload_pk>/       abort
+
+def _upload_data(upload):
+    return {
+        'id': upload.pk,
+        'file_name': upload.file_name,
+        'offset': upload.received_size,
+        'total_size': upload.total_size,
+        'status': upload.status,
+        'chunk_size': UPLOAD_CHUNK_SIZE,
+    }
+
+
+@csrf_exempt
+@login_required
+@app_access_required
+def start_file_upload(request, organization_pk, app_pk, list_pk, record_pk):
+    if request.method != "POST":
+        return HttpResponse('method not allowed', status=405)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk, list_id=list_pk)
+    try:
+        upload = start_upload(record, request.user, request.POST.get('file_name'), int(request.POST.get('size', '')))
+    except (ValueError, UploadError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(_upload_data(upload))
+
+
+@csrf_exempt
+@login_required
+@app_access_required
+def file_upload(request, organization_pk, app_pk, list_pk, record_pk, upload_pk):
+    upload = get_object_or_404(FileUpload, pk=upload_pk, record_id=record_pk, created_user=request.user)
+
+    if request.method == "POST":
+        if 'file' not in request.FILES:
+            return JsonResponse({'error': 'No chunk sent'}, status=400)
+        try:
+            upload = append_chunk(upload, int(request.POST.get('offset', '')), request.FILES['file'], request.POST.get('checksum'))
+        except UploadConflict as error:
+            upload.refresh_from_db()
+            return JsonResponse(dict(_upload_data(upload), error=str(error)), status=409)
+        except (ValueError, UploadError) as error:
+            return JsonResponse({'error': str(error)}, status=400)
+    elif request.method == "DELETE":
+        try:
+            upload = abort_upload(upload)
+        except UploadError as error:
+            return JsonResponse(dict(_upload_data(upload), error=str(error)), status=400)
+
+    return JsonResponse(_upload_data(upload))
+
+
+@csrf_exempt
+@login_required
+@app_access_required
+def complete_file_upload(request, organization_pk, app_pk, list_pk, record_pk, upload_pk):
+    if request.method != "POST":
+        return HttpResponse('method not allowed', status=405)
+    upload = get_object_or_404(FileUpload, pk=upload_pk, record_id=record_pk, created_user=request.user)
+    try:
+        record_file = complete_upload(upload, request.POST.get('checksum'))
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    bump_record(record_pk)
+    log_event(Event.FILE_ADDED, organization_pk, app_pk, list_pk, record_pk, user=request.user,
+              data={'file': record_file.pk, 'name': upload.file_name})
+    enqueue(process_record_file, record_file_pk=record_file.pk)
+    final =json.dumps(record_file_data(RecordFile.objects.get(pk=record_file.pk)))
     return JsonResponse(data=final, safe=False)
 
 
@@ -1357,17 +1592,23 @@ def post_record_file(request,organization_pk, app_pk, list_pk, record_pk):
 
 
 @csrf_exempt
+@login_required
+@app_access_required
 def delete_record_file(request,organization_pk, app_pk, list_pk, record_pk,record_file_pk):
-    record_File = RecordFile.objects.get(pk=record_file_pk)
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk, list_id=list_pk)
+    record_File = get_object_or_404(RecordFile, pk=record_file_pk, record=record)
     record_File.delete()
+    bump_record(record_File.record_id)
+    log_event(Event.FILE_DELETED, organization_pk, app_pk, list_pk, record_File.record_id, user=request.user,
+              data={'file': record_File.pk, 'name': record_File.name_of_file + record_File.file_extension})
     final = {}
     final['deleted'] = "deleted"
     final =json.dumps(final)
     return redirect(reverse('record',kwargs={
-        'organization_pk':record_File.record.list.app.organization.pk,
-        'list_pk':record_File.record.list.pk,
-        'app_pk':record_File.record.list.app.pk,
-        'record_pk':record_File.record.pk,
+        'organization_pk':organization_pk,
+        'list_pk':list_pk,
+        'app_pk':app_pk,
+        'record_pk':record.pk,
     }))
 
 
@@ -1377,6 +1618,9 @@ def delete_record_comment(request,record_comment_pk,organization_pk, app_pk, lis
     if record_Comment.created_user != request.user:
          HttpResponse('Unauthorized', status=401)
     record_Comment.delete()
+    bump_record(record_Comment.record_id)
+    log_event(Event.COMMENT_DELETED, organization_pk, app_pk, list_pk, record_Comment.record_id, user=request.user,
+              data={'comment': record_comment_pk})
     final = {}
     final['deleted'] = "deleted"
     final =json.dumps(final)
@@ -1395,6 +1639,9 @@ def edit_record_comment(request,organization_pk, app_pk, list_pk, record_pk,reco
             #print(request.POST['content'])
             comment.content = request.POST['comment-content-%s' % record_comment_pk]
             comment.save()
+            bump_record(comment.record_id)
+            log_event(Event.COMMENT_EDITED, organization_pk, app_pk, list_pk, comment.record_id, user=request.user,
+                      data={'comment': comment.pk})
         else:
             HttpResponse('Unauthorized', status=401)
         return JsonResponse({
@@ -1404,6 +1651,15 @@ def edit_record_comment(request,organization_pk, app_pk, list_pk, record_pk,reco
         return HttpResponse('method not allowed')
 
 
+@login_required
+@app_access_required
+def download_record_file(request, organization_pk, app_pk, list_pk, record_pk, record_file_pk):
+    # Downloads under the file's current name, see home/blobs.py
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk, list_id=list_pk)
+    record_file = get_object_or_404(RecordFile, pk=record_file_pk, record=record)
+    return download_response(record_file.file, record_file.name_of_file + record_file.file_extension)
+
+
 # @csrf_exempt
 # def edit_file(request,file_id,new_name):
 #     file = RecordFile.objects.get(pk=file_id)
@@ -1412,22 +1668,19 @@ def edit_record_comment(request,organization_pk, app_pk, list_pk, record_pk,reco
 
 
 @csrf_exempt
+@login_required
+@app_access_required
 def edit_record_file(request,organization_pk, app_pk, list_pk, record_pk,record_file_pk):
-    record_File = RecordFile.objects.get(pk=record_file_pk)
-    new_name = request.POST['content']
-    record_File.name_of_file = new_name
-    new_name += record_File.file_extension
-    initial_path = record_File.file.path
-    initial_name = record_File.file.name
-    new_path = initial_name.split('/')
-    new_path.pop()
-    new_path_proto = '/'.join(new_path)
-    new_path_proto += '/'
-    new_path = settings.MEDIA_ROOT + '/' +  new_path_proto  + new_name
-    os.rename(initial_path, new_path)
-    record_File.file.name = new_path_proto + new_name
-    print(record_File.file.name,record_File.file.url,record_File.file.path)
-    record_File.save()
+    # The stored object is never moved, the name only lives in the database
+    # and is used as the download name
+    record = get_object_or_404(Record.scoped.for_tenant(organization_pk, app_pk), pk=record_pk, list_id=list_pk)
+    record_File = get_object_or_404(RecordFile, pk=record_file_pk, record=record)
+    old_name = record_File.name_of_file
+    record_File.name_of_file = request.POST['content']
+    record_File.save(update_fields=['name_of_file'])
+    bump_record(record_File.record_id)
+    log_event(Event.FILE_RENAMED, organization_pk, app_pk, list_pk, record_File.record_id, user=request.user,
+              data={'file': record_File.pk, 'name': [old_name, record_File.name_of_file]})
     return JsonResponse({
         "content": record_File.name_of_file,
         "file_url":record_File.file.url
@@ -2,6 +2,7 @@
 
 python3 manage.py makemigrations
 python3 manage.py migrate
+python3 manage.py createcachetable
 
 echo Create first user
 DJANGO_DB_NAME=default